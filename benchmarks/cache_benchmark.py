@@ -0,0 +1,287 @@
+"""
+Replays key streams against every cache backend and eviction policy, the way the handlers use
+the cache (get, and put on a miss), and reports hit ratio, ops/sec, get and put latency
+percentiles and peak memory. Use it before changing max_size, ttl or evict_strategy.
+
+    python -m benchmarks.cache_benchmark [--backends memory,redis,tiered] [--max-size 1000] [--output cache.json]
+    python -m benchmarks.cache_benchmark --log access.log
+
+Workloads:
+    zipf        Zipf-distributed free-text searches
+    filterby    the /filterby key shapes: #hashtags, @user fragments and the page keys of free-text searches
+    scan        zipf with bursts of one-off keys, twice the cache size each, that a scan-resistant policy ignores
+    ttl_churn   zipf with a ttl of --churn-ttl-requests requests, so hot entries keep expiring and being
+                reloaded. The ttl is converted to seconds per backend from the time a request takes on it.
+    log         the requests of a recorded log (--log): one cache key or request URL per line, lines of an
+                access log work too. URLs are keyed the way search.py keys them.
+
+Plain text keys (zipf, scan, ttl_churn) and @user keys are matched by substring, so a lookup can be
+answered by a longer cached key and counts as a hit. Page keys are only matched exactly. redis and tiered need REDIS_URL (or a local Redis), and
+are skipped when it cannot be reached. Peak memory is the traced Python allocations for the
+in-process cache, and the growth of used_memory for Redis.
+"""
+import argparse
+import os
+import random
+import re
+import string
+import sys
+import time
+import tracemalloc
+from urllib.parse import urlsplit, parse_qs
+
+import orjson
+
+from cache.custom_cache import Cache
+from cache.eviction import EVICTION_POLICIES
+from cache.key_index import page_cache_key
+from cache.redis_cache import RedisCache
+from cache.response_cache import CachedResponse
+from cache.tiered_cache import TieredCache
+from database.pagination import DEFAULT_PAGE_SIZE, clamp_page_size
+
+REQUEST_PATTERN = re.compile(r'"(?:GET|POST) (\S+)')
+
+
+def zipf_sampler(population, exponent, rng):
+    """Draw from population with probability proportional to 1 / rank**exponent"""
+    total = 0.0
+    cum_weights = []
+    for rank in range(1, len(population) + 1):
+        total += 1 / rank ** exponent
+        cum_weights.append(total)
+    return lambda count: rng.choices(population, cum_weights=cum_weights, k=count)
+
+
+def random_words(count, rng):
+    """Distinct made-up words, so free-text keys do not contain each other by accident"""
+    words = set()
+    while len(words) < count:
+        words.add(''.join(rng.choices(string.ascii_lowercase, k=rng.randint(5, 10))))
+    return sorted(words)
+
+
+def zipf_keys(args, rng):
+    return zipf_sampler(random_words(args.vocabulary, rng), args.zipf_exponent, rng)(args.requests)
+
+
+def filterby_keys(args, rng):
+    words = random_words(args.vocabulary, rng)
+    text = zipf_sampler(words, args.zipf_exponent, rng)
+    hashtags = zipf_sampler(['#' + word for word in words[:args.vocabulary // 10]], args.zipf_exponent, rng)
+    users = zipf_sampler(['@' + word[:rng.randint(3, len(word))] for word in words], args.zipf_exponent, rng)
+    keys = []
+    for kind in rng.choices(['text', 'hashtag', 'user', 'page'], [5, 2, 2, 1], k=args.requests):
+        if kind == 'text':
+            keys.append(page_cache_key('search', 'mongo', text(1)[0], DEFAULT_PAGE_SIZE, ''))
+        elif kind == 'hashtag':
+            keys.append(hashtags(1)[0])
+        elif kind == 'user':
+            keys.append(users(1)[0])
+        else:
+            # Later pages are rarer, their cursors are opaque tokens
+            page = min(int(rng.paretovariate(1.5)), 20)
+            keys.append(page_cache_key('search', 'mongo', text(1)[0], DEFAULT_PAGE_SIZE,
+                                       f"cursor{page}" if page > 1 else ''))
+    return keys
+
+
+def scan_keys(args, rng):
+    keys = zipf_keys(args, rng)
+    burst = 2 * args.max_size
+    result = []
+    for index, key in enumerate(keys):
+        if index and index % args.scan_every == 0:
+            result.extend(f"scan {index} {i}" for i in range(burst))
+        result.append(key)
+    return result
+
+
+def request_key(url):
+    """The cache key search.py uses for a request URL, None for requests it does not cache"""
+    parts = urlsplit(url)
+    query = {name: values[0] for name, values in parse_qs(parts.query).items()}
+    search = query.get('search', '')
+    limit = clamp_page_size(int(query.get('limit', DEFAULT_PAGE_SIZE)))
+    cursor = query.get('cursor', '')
+    if query.get('stream', 'false').lower() == 'true':
+        return None
+    if parts.path == '/gettweetsbyuserid':
+        return page_cache_key('tweetsbyuser', query.get('user_id', ''), limit, cursor)
+    if parts.path != '/filterby' or not search:
+        return None
+    if search.startswith('@'):
+        return search
+    if query.get('ishashtag', 'false').lower() == 'true':
+        return search if search.startswith('#') else '#' + search
+    return page_cache_key('search', os.getenv('SEARCH_BACKEND', 'mongo'), search, limit, cursor)
+
+
+def log_keys(path):
+    keys = []
+    with open(path) as log_file:
+        for line in log_file:
+            line = line.strip()
+            if not line:
+                continue
+            match = REQUEST_PATTERN.search(line)
+            url = match.group(1) if match else line
+            key = request_key(url) if url.startswith('/') else url
+            if key:
+                keys.append(key)
+    return keys
+
+
+def percentiles(latencies):
+    latencies = sorted(latencies)
+    if not latencies:
+        return None
+
+    def at(fraction):
+        return latencies[min(len(latencies) - 1, int(fraction * len(latencies)))] * 1e6
+
+    return {'p50': at(0.50), 'p95': at(0.95), 'p99': at(0.99), 'max': latencies[-1] * 1e6}
+
+
+def replay(cache, keys, value):
+    """Cache-aside over the keys, returns (hits, get latencies, put latencies, seconds)"""
+    hits = 0
+    get_latencies = []
+    put_latencies = []
+    start_time = time.perf_counter()
+    for key in keys:
+        before_get = time.perf_counter()
+        found = cache.get(key)
+        after_get = time.perf_counter()
+        get_latencies.append(after_get - before_get)
+        if found:
+            hits += 1
+        else:
+            cache.put(key, value)
+            put_latencies.append(time.perf_counter() - after_get)
+    return hits, get_latencies, put_latencies, time.perf_counter() - start_time
+
+
+def redis_used_memory(cache):
+    client = cache.l2.redis_client if isinstance(cache, TieredCache) else cache.redis_client
+    try:
+        return client.info('memory')['used_memory']
+    except Exception:
+        # fakeredis and some managed servers do not report memory
+        return None
+
+
+def make_backends(names, max_size):
+    """(backend name, factory(policy, ttl)) for the backends that can run here"""
+    backends = []
+    if 'memory' in names:
+        backends.append(('memory', lambda policy, ttl: Cache(max_size, policy, ttl=ttl, checkpoint_file=None)))
+    if {'redis', 'tiered'} & set(names):
+        probe = RedisCache(max_size)
+        if probe.redis_client is None:
+            print("Redis is not reachable, skipping the redis and tiered backends", file=sys.stderr)
+            return backends
+        if 'redis' in names:
+            backends.append(('redis', lambda policy, ttl: RedisCache(max_size, policy, ttl=ttl)))
+        if 'tiered' in names:
+            backends.append(('tiered', lambda policy, ttl: TieredCache(max_size, policy, ttl=ttl)))
+    return backends
+
+
+def churn_ttl(factory, policy, keys, value, ttl_requests):
+    """The ttl in seconds that lasts ttl_requests requests on this backend, timed on a cache without ttl"""
+    sample = keys[:max(ttl_requests, 1000)]
+    cache = factory(policy, None)
+    if hasattr(cache, 'clear_cache'):
+        cache.clear_cache()
+    seconds = replay(cache, sample, value)[3]
+    if hasattr(cache, 'clear_cache'):
+        cache.clear_cache()
+    return seconds / len(sample) * ttl_requests
+
+
+def run(factory, policy, ttl, keys, value):
+    cache = factory(policy, ttl)
+    if hasattr(cache, 'clear_cache'):
+        cache.clear_cache()
+        memory_before = redis_used_memory(cache)
+        hits, get_latencies, put_latencies, seconds = replay(cache, keys, value)
+        memory_after = redis_used_memory(cache)
+        peak_memory = memory_after - memory_before if memory_before is not None else None
+        cache.clear_cache()
+    else:
+        hits, get_latencies, put_latencies, seconds = replay(cache, keys, value)
+        # A second pass on a fresh cache under tracemalloc, which would distort the timings
+        cache = factory(policy, ttl)
+        tracemalloc.start()
+        for key in keys:
+            if not cache.get(key):
+                cache.put(key, value)
+        peak_memory = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    operations = len(get_latencies) + len(put_latencies)
+    return {
+        'requests': len(keys),
+        'hit_ratio': hits / len(keys) if keys else None,
+        'ops_per_sec': operations / seconds if seconds else None,
+        'get_us': percentiles(get_latencies),
+        'put_us': percentiles(put_latencies),
+        'peak_memory_bytes': peak_memory,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Cache backend and eviction policy benchmark")
+    parser.add_argument('--backends', default='memory,redis,tiered')
+    parser.add_argument('--policies', default=','.join(EVICTION_POLICIES))
+    parser.add_argument('--workloads', default='zipf,filterby,scan,ttl_churn')
+    parser.add_argument('--log', help="Recorded request log to replay as the log workload")
+    parser.add_argument('--requests', type=int, default=50000, help="Requests per generated workload")
+    parser.add_argument('--vocabulary', type=int, default=20000, help="Distinct search terms")
+    parser.add_argument('--zipf-exponent', type=float, default=1.0)
+    parser.add_argument('--max-size', type=int, default=1000)
+    parser.add_argument('--ttl', type=float, default=None, help="ttl of every workload but ttl_churn")
+    parser.add_argument('--churn-ttl-requests', type=int, default=2000, help="ttl of the ttl_churn workload")
+    parser.add_argument('--scan-every', type=int, default=10000, help="Requests between two scan bursts")
+    parser.add_argument('--value-size', type=int, default=2048, help="Bytes of each cached response body")
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--output', help="Also write the results as JSON to this file")
+    args = parser.parse_args()
+
+    generators = {'zipf': zipf_keys, 'filterby': filterby_keys, 'scan': scan_keys, 'ttl_churn': zipf_keys}
+    workloads = []
+    for name in filter(None, args.workloads.split(',')):
+        if name not in generators:
+            parser.error(f"Unknown workload: {name}, expected one of {', '.join(generators)}")
+        workloads.append((name, generators[name](args, random.Random(args.seed)), args.ttl))
+    if args.log:
+        workloads.append(('log', log_keys(args.log), args.ttl))
+
+    value = CachedResponse(b'x' * args.value_size)
+    results = []
+    print(f"{'workload':<11}{'backend':<8}{'policy':<16}{'hit ratio':>10}{'ops/s':>10}"
+          f"{'get p50 us':>12}{'get p99 us':>12}{'put p99 us':>12}{'peak MB':>9}")
+    for backend, factory in make_backends(args.backends.split(','), args.max_size):
+        for policy in args.policies.split(','):
+            for workload, keys, ttl in workloads:
+                if workload == 'ttl_churn':
+                    ttl = churn_ttl(factory, policy, keys, value, args.churn_ttl_requests)
+                result = {'workload': workload, 'backend': backend, 'policy': policy, 'ttl': ttl,
+                          **run(factory, policy, ttl, keys, value)}
+                results.append(result)
+                get_us, put_us = result['get_us'] or {}, result['put_us'] or {}
+                peak = result['peak_memory_bytes']
+                print(f"{workload:<11}{backend:<8}{policy:<16}{result['hit_ratio']:>10.3f}{result['ops_per_sec']:>10.0f}"
+                      f"{get_us.get('p50', 0):>12.1f}{get_us.get('p99', 0):>12.1f}{put_us.get('p99', 0):>12.1f}"
+                      f"{peak / 1e6 if peak is not None else float('nan'):>9.1f}")
+
+    if args.output:
+        config = {name: value for name, value in vars(args).items() if name != 'output'}
+        with open(args.output, 'wb') as output_file:
+            output_file.write(orjson.dumps({'benchmark': 'cache', 'config': config, 'results': results},
+                                           option=orjson.OPT_INDENT_2))
+        print(f"Wrote {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+"""
+Throughput of the /filterby text search path with 50-500 parallel clients, comparing the
+blocking pymongo calls the handlers used to make with the async driver now in database/tweets.py.
+
+Needs a local mongod (the benchmark seeds its own database and drops it afterwards):
+
+    BENCH_MONGODB_URI=mongodb://localhost:27017 python -m benchmarks.concurrency_benchmark
+"""
+import asyncio
+import os
+import random
+import time
+
+import pymongo
+from pymongo import AsyncMongoClient
+
+from benchmarks.synthetic import make_corpus, WORDS
+from database import tweets as tweet_queries
+from database.pagination import DEFAULT_PAGE_SIZE, KEYSET_SORT
+
+MONGODB_URI = os.getenv('BENCH_MONGODB_URI', 'mongodb://localhost:27017')
+DATABASE_NAME = 'twitter-benchmark'
+TWEET_COUNT = int(os.getenv('BENCH_TWEETS', '50000'))
+REQUESTS_PER_CLIENT = int(os.getenv('BENCH_REQUESTS_PER_CLIENT', '10'))
+CONCURRENCY_LEVELS = (50, 100, 200, 500)
+
+
+def seed(sync_client):
+    collection = sync_client[DATABASE_NAME]['tweets']
+    collection.drop()
+    _, tweets = make_corpus(TWEET_COUNT, TWEET_COUNT // 10)
+    collection.insert_many(tweets, ordered=False)
+    collection.create_index([("text", "text")])
+    print(f"Seeded {collection.count_documents({})} tweets")
+
+
+async def run_clients(concurrency, handler):
+    """Start `concurrency` clients that each send REQUESTS_PER_CLIENT searches, return requests/sec"""
+    async def client(seed_value):
+        rng = random.Random(seed_value)
+        for _ in range(REQUESTS_PER_CLIENT):
+            await handler(rng.choice(WORDS))
+
+    start_time = time.perf_counter()
+    await asyncio.gather(*(client(i) for i in range(concurrency)))
+    return concurrency * REQUESTS_PER_CLIENT / (time.perf_counter() - start_time)
+
+
+async def main():
+    sync_client = pymongo.MongoClient(MONGODB_URI, maxPoolSize=100)
+    async_client = AsyncMongoClient(MONGODB_URI, maxPoolSize=100)
+    seed(sync_client)
+    sync_collection = sync_client[DATABASE_NAME]['tweets']
+    async_collection = async_client[DATABASE_NAME]['tweets']
+
+    async def blocking_handler(search):
+        # What the handlers did before: a blocking driver call inside an async def
+        query = {"$text": {"$search": search}}
+        return list(sync_collection.find(query).sort(KEYSET_SORT).limit(DEFAULT_PAGE_SIZE + 1))
+
+    async def async_handler(search):
+        return await tweet_queries.search_tweets(async_collection, search)
+
+    print(f"{'clients':>8}{'blocking req/s':>18}{'async req/s':>15}")
+    for concurrency in CONCURRENCY_LEVELS:
+        blocking = await run_clients(concurrency, blocking_handler)
+        non_blocking = await run_clients(concurrency, async_handler)
+        print(f"{concurrency:>8}{blocking:>18.1f}{non_blocking:>15.1f}")
+
+    sync_client.drop_database(DATABASE_NAME)
+    sync_client.close()
+    await async_client.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,66 @@
+"""
+Lines/sec of parsing a raw tweet corpus file: the single-core json + strptime loop the data
+processors used, against database/corpus_reader.py with a growing number of worker processes.
+
+    python -m benchmarks.corpus_reader_benchmark
+"""
+import json
+import os
+import tempfile
+import time
+from datetime import datetime
+
+from benchmarks.synthetic import make_raw_corpus
+from database.corpus_reader import read_corpus
+
+LINE_COUNT = int(os.getenv('BENCH_LINES', '200000'))
+CHUNK_SIZE = int(os.getenv('BENCH_CHUNK_SIZE', str(4 * 1024 * 1024)))
+
+
+def created_date(created_at):
+    return datetime.strptime(created_at, "%a %b %d %H:%M:%S %z %Y").strftime("%Y-%m-%d %H:%M:%S")
+
+
+def parse_line_by_line(file_path):
+    """What the tweet and user processors did: json.loads and strptime, one line at a time"""
+    records = 0
+    with open(file_path, "r") as read_file:
+        for line in read_file:
+            data = json.loads(line)
+            created_date(data['created_at'])
+            created_date(data['user']['created_at'])
+            if data.get('retweeted_status'):
+                created_date(data['retweeted_status']['created_at'])
+            records += 1
+    return records
+
+
+def parse_with_reader(file_path, workers):
+    return sum(len(chunk) for chunk in read_corpus(file_path, workers, CHUNK_SIZE))
+
+
+def main():
+    with tempfile.NamedTemporaryFile('w', suffix='.jsonl', delete=False) as corpus_file:
+        for line in make_raw_corpus(LINE_COUNT, LINE_COUNT // 10):
+            corpus_file.write(line + '\n')
+    file_path = corpus_file.name
+    print(f"{LINE_COUNT} lines, {os.path.getsize(file_path) / 1024 / 1024:.1f} MB, {os.cpu_count()} cores")
+
+    worker_counts = [1]
+    while worker_counts[-1] * 2 <= (os.cpu_count() or 1):
+        worker_counts.append(worker_counts[-1] * 2)
+    try:
+        print(f"{'reader':<28}{'lines/s':>12}")
+        start_time = time.perf_counter()
+        lines = parse_line_by_line(file_path)
+        print(f"{'json + strptime, 1 core':<28}{lines / (time.perf_counter() - start_time):>12.0f}")
+        for workers in worker_counts:
+            start_time = time.perf_counter()
+            lines = parse_with_reader(file_path, workers)
+            print(f"{f'corpus_reader, {workers} workers':<28}{lines / (time.perf_counter() - start_time):>12.0f}")
+    finally:
+        os.remove(file_path)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,207 @@
+"""
+In-process stand-ins for the MongoDB tweets collection and the Supabase users table, so the API
+can be benchmarked end to end without a database. They answer exactly the queries database/
+sends (find() with equality, $text, keyset $or, sort and limit, PostgREST select/order/limit/
+gt/ilike), from indexes built on the seeded documents, and wait latency seconds per query to
+stand in for the network round trip.
+"""
+import asyncio
+import re
+
+from bson import ObjectId
+
+TOKEN_PATTERN = re.compile(r"\w+")
+
+
+def tokens(text):
+    return set(TOKEN_PATTERN.findall((text or '').lower()))
+
+
+def matches_condition(value, condition):
+    if isinstance(condition, dict) and condition and all(key.startswith('$') for key in condition):
+        for operator, operand in condition.items():
+            if operator == '$lt' and not value < operand:
+                return False
+            if operator == '$lte' and not value <= operand:
+                return False
+            if operator == '$gt' and not value > operand:
+                return False
+            if operator == '$gte' and not value >= operand:
+                return False
+            if operator == '$in' and value not in operand:
+                return False
+        return True
+    if isinstance(value, list):
+        return condition in value
+    return value == condition
+
+
+def project(document, projection):
+    if not projection:
+        return dict(document)
+    fields = [field for field, included in projection.items() if included and field != '_id']
+    result = {field: document[field] for field in fields if field in document}
+    if projection.get('_id', 1):
+        result['_id'] = document['_id']
+    return result
+
+
+class FakeCursor:
+    def __init__(self, collection, filter=None, projection=None, sort=None, limit=0):
+        self.collection = collection
+        self.filter = filter or {}
+        self.projection = projection
+        self.sort_keys = list(sort or [])
+        self.limit_count = limit
+
+    def sort(self, key, direction=None):
+        self.sort_keys = [(key, direction or 1)] if isinstance(key, str) else list(key)
+        return self
+
+    def limit(self, count):
+        self.limit_count = count
+        return self
+
+    def _results(self):
+        documents = [document for document in self.collection.candidates(self.filter)
+                     if self.collection.matches(document, self.filter)]
+        for field, direction in reversed(self.sort_keys):
+            documents.sort(key=lambda document: document[field], reverse=direction == -1)
+        if self.limit_count:
+            documents = documents[:self.limit_count]
+        return [project(document, self.projection) for document in documents]
+
+    async def to_list(self, length=None):
+        await asyncio.sleep(self.collection.latency)
+        results = self._results()
+        return results[:length] if length else results
+
+    async def _iterate(self):
+        for document in await self.to_list():
+            yield document
+
+    def __aiter__(self):
+        return self._iterate()
+
+
+class FakeCollection:
+    def __init__(self, documents, latency=0.0):
+        self.latency = latency
+        self.documents = []
+        self.by_id = {}
+        self.by_field = {'hashtag': {}, 'user_screen_name': {}}
+        self.by_token = {}
+        self.document_tokens = {}
+        for document in documents:
+            self.insert_one(document)
+
+    def insert_one(self, document):
+        document = {'_id': ObjectId(), **document}
+        self.documents.append(document)
+        self.by_id[document['_id']] = document
+        for field, index in self.by_field.items():
+            values = document.get(field)
+            for value in values if isinstance(values, list) else [values]:
+                index.setdefault(value, []).append(document)
+        self.document_tokens[document['_id']] = tokens(document.get('text'))
+        for token in self.document_tokens[document['_id']]:
+            self.by_token.setdefault(token, []).append(document)
+
+    def candidates(self, filter):
+        """The documents an index narrows the filter down to, every document when none applies"""
+        if '$text' in filter:
+            found = {}
+            for token in tokens(filter['$text']['$search']):
+                for document in self.by_token.get(token, []):
+                    found[document['_id']] = document
+            return list(found.values())
+        for field, index in self.by_field.items():
+            if field in filter and not isinstance(filter[field], dict):
+                return index.get(filter[field], [])
+        return self.documents
+
+    def matches(self, document, filter):
+        for key, condition in filter.items():
+            if key == '$or':
+                if not any(self.matches(document, clause) for clause in condition):
+                    return False
+            elif key == '$text':
+                if not tokens(condition['$search']) & self.document_tokens[document['_id']]:
+                    return False
+            elif not matches_condition(document.get(key), condition):
+                return False
+        return True
+
+    def find(self, filter=None, projection=None, sort=None, limit=0):
+        return FakeCursor(self, filter, projection, sort, limit)
+
+
+class FakeMongoClient:
+    """client[database]['tweets'] is the seeded collection, whatever the database name"""
+
+    def __init__(self, tweets_collection):
+        self.tweets_collection = tweets_collection
+
+    def __getitem__(self, name):
+        return {'tweets': self.tweets_collection}
+
+    async def close(self):
+        pass
+
+
+class FakeResponse:
+    def __init__(self, data):
+        self.data = data
+
+
+class FakeQuery:
+    def __init__(self, rows, latency):
+        self.rows = rows
+        self.latency = latency
+        self.columns = None
+        self.filters = []
+        self.order_keys = []
+        self.limit_count = None
+
+    def select(self, columns):
+        self.columns = None if columns == '*' else columns.split(',')
+        return self
+
+    def order(self, column, desc=False):
+        self.order_keys.append((column, desc))
+        return self
+
+    def limit(self, count):
+        self.limit_count = count
+        return self
+
+    def gt(self, column, value):
+        self.filters.append(lambda row: row[column] > value)
+        return self
+
+    def ilike(self, column, pattern):
+        expression = re.compile('^' + '.*'.join(map(re.escape, pattern.split('%'))) + '$', re.IGNORECASE | re.DOTALL)
+        self.filters.append(lambda row: expression.match(row[column] or '') is not None)
+        return self
+
+    async def execute(self):
+        await asyncio.sleep(self.latency)
+        rows = [row for row in self.rows if all(accepts(row) for accepts in self.filters)]
+        for column, desc in reversed(self.order_keys):
+            rows.sort(key=lambda row: row[column], reverse=desc)
+        if self.limit_count is not None:
+            rows = rows[:self.limit_count]
+        if self.columns:
+            rows = [{column: row.get(column) for column in self.columns} for row in rows]
+        return FakeResponse([dict(row) for row in rows])
+
+
+class FakeSupabase:
+    """The subset of the async Supabase client that database/users.py and database/user_index.py use"""
+
+    def __init__(self, tables, latency=0.0):
+        self.tables = tables
+        self.latency = latency
+
+    def table(self, name):
+        return FakeQuery(self.tables[name], self.latency)
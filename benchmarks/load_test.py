@@ -0,0 +1,268 @@
+"""
+End-to-end load test of the API: seeds a synthetic corpus, drives every endpoint through the
+ASGI app in process and reports throughput and p50/p95/p99 latency per concurrency level, once
+with an empty cache (cold) and once replaying the same requests (warm).
+
+    python -m benchmarks.load_test [--concurrency 1,16,64] [--requests 2000] [--output load_test.json]
+
+Tweets are served by the in-memory collection in benchmarks/fake_backends.py, or with
+--mongodb-uri by a local mongod (seeded into the twitter-benchmark database, dropped afterwards).
+Users always come from the in-memory Supabase stand-in. Both fakes wait --db-latency-ms per query.
+The cache, search backend etc. are configured through the usual environment variables
+(CACHE_BACKEND, SEARCH_BACKEND, ...), and recorded in the JSON report with the git commit,
+so reports of two commits can be diffed.
+
+--mix sets the relative weight of each request kind, e.g. --mix filterby_text=5,hashtags=1;
+kinds left out keep their default weight, weight 0 drops a kind.
+"""
+import argparse
+import asyncio
+import contextlib
+import os
+import platform
+import random
+import subprocess
+import sys
+import time
+
+import httpx
+import orjson
+import pymongo
+
+from benchmarks.fake_backends import FakeCollection, FakeMongoClient, FakeSupabase
+from benchmarks.synthetic import make_corpus, WORDS, HASHTAGS
+from database import connections
+from database.indexes import ensure_tweet_indexes
+
+BENCHMARK_DATABASE = 'twitter-benchmark'
+DEFAULT_MIX = {
+    'hashtags': 1,
+    'recenttweets': 1,
+    'trendingtweets': 1,
+    'trendingusers': 1,
+    'gettweetsbyuserid': 2,
+    'filterby_users': 2,
+    'filterby_hashtag': 2,
+    'filterby_text': 4,
+}
+ENV_SETTINGS = ('CACHE_BACKEND', 'CACHE_RESPONSES', 'COMPRESS_CACHED_RESPONSES', 'SEARCH_BACKEND', 'SEARCH_RANKING',
+                'TRENDING_REFRESH_INTERVAL', 'MONGODB_MAX_POOL_SIZE', 'SUPABASE_MAX_CONCURRENCY', 'METRICS_ENABLED')
+
+
+def parse_mix(text):
+    mix = dict(DEFAULT_MIX)
+    for entry in filter(None, (text or '').split(',')):
+        kind, _, weight = entry.partition('=')
+        if kind not in DEFAULT_MIX:
+            raise ValueError(f"Unknown request kind: {kind}, expected one of {', '.join(DEFAULT_MIX)}")
+        mix[kind] = float(weight)
+    return {kind: weight for kind, weight in mix.items() if weight > 0}
+
+
+def make_requests(count, mix, users, tweets, seed):
+    """(kind, url) pairs drawn from the corpus, the same list for every run with the same seed"""
+    rng = random.Random(seed)
+    kinds = list(mix)
+    weights = [mix[kind] for kind in kinds]
+
+    def url(kind):
+        if kind == 'hashtags':
+            return f"/hashtags?window={rng.choice(['all', 'hour', 'day'])}"
+        if kind in ('recenttweets', 'trendingtweets', 'trendingusers'):
+            return f"/{kind}"
+        if kind == 'gettweetsbyuserid':
+            # Picking a random tweet's author favours the prolific users, as real traffic does
+            return f"/gettweetsbyuserid?user_id=@{rng.choice(tweets)['user_screen_name']}"
+        if kind == 'filterby_users':
+            screen_name = rng.choice(users)['screen_name']
+            start = rng.randrange(len(screen_name))
+            return f"/filterby?search=@{screen_name[start:start + rng.randint(2, 6)]}"
+        if kind == 'filterby_hashtag':
+            return f"/filterby?search={rng.choice(HASHTAGS)}&ishashtag=true"
+        return f"/filterby?search={' '.join(rng.sample(WORDS, rng.choice([1, 1, 2])))}"
+
+    return [(kind, url(kind)) for kind in rng.choices(kinds, weights, k=count)]
+
+
+def percentile(sorted_values, fraction):
+    """Nearest-rank percentile of an ascending list"""
+    if not sorted_values:
+        return None
+    return sorted_values[min(len(sorted_values) - 1, max(0, int(round(fraction * len(sorted_values))) - 1))]
+
+
+def summarize(latencies, errors, duration):
+    latencies = sorted(latencies)
+    return {
+        'requests': len(latencies),
+        'errors': errors,
+        'throughput_rps': len(latencies) / duration if duration else None,
+        'latency_ms': {
+            'mean': sum(latencies) / len(latencies) * 1e3 if latencies else None,
+            'p50': percentile(latencies, 0.50) * 1e3 if latencies else None,
+            'p95': percentile(latencies, 0.95) * 1e3 if latencies else None,
+            'p99': percentile(latencies, 0.99) * 1e3 if latencies else None,
+            'max': latencies[-1] * 1e3 if latencies else None,
+        },
+    }
+
+
+async def run_requests(client, requests, concurrency):
+    """Send the requests from `concurrency` clients, each taking the next one when its last completes"""
+    results = {kind: ([], 0) for kind, _ in requests}
+    pending = iter(requests)
+
+    async def worker():
+        for kind, url in pending:
+            start_time = time.perf_counter()
+            response = await client.get(url)
+            latency = time.perf_counter() - start_time
+            latencies, errors = results[kind]
+            latencies.append(latency)
+            # Handlers report most failures as a 200 with an {"error": ...} body
+            if response.status_code != 200 or response.content.startswith(b'{"error"'):
+                results[kind] = (latencies, errors + 1)
+
+    start_time = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    duration = time.perf_counter() - start_time
+
+    all_latencies = [latency for latencies, _ in results.values() for latency in latencies]
+    report = summarize(all_latencies, sum(errors for _, errors in results.values()), duration)
+    report['duration_s'] = duration
+    report['endpoints'] = {kind: summarize(latencies, errors, duration)
+                           for kind, (latencies, errors) in sorted(results.items())}
+    return report
+
+
+def reset_cache(search):
+    """Start from an empty cache: a fresh in-memory cache (never journaled to disk), or a flushed Redis"""
+    if hasattr(search.cache, 'clear_cache'):
+        search.cache.clear_cache()
+    else:
+        search.cache = search.Cache(checkpoint_file=None)
+
+
+async def wait_until_loaded(search, timeout=120):
+    """Wait for the trending views and in-memory indexes, so the runs measure requests and not startup"""
+    for name in search.trending_views.views:
+        await search.trending_views.wait_ready(name, timeout)
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        engine_ready = search.search_engine is None or search.search_engine.ready
+        if engine_ready and (search.user_index.ready or search.supabase is None):
+            return
+        await asyncio.sleep(0.05)
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__)), check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def seed_mongodb(uri, tweets):
+    """Seed the benchmark database of a local mongod, returns the async client for search.py"""
+    sync_client = pymongo.MongoClient(uri)
+    collection = sync_client[BENCHMARK_DATABASE]['tweets']
+    collection.drop()
+    collection.insert_many([dict(tweet) for tweet in tweets], ordered=False)
+    ensure_tweet_indexes(collection)
+    sync_client.close()
+    return pymongo.AsyncMongoClient(uri)
+
+
+def drop_mongodb(uri):
+    sync_client = pymongo.MongoClient(uri)
+    sync_client.drop_database(BENCHMARK_DATABASE)
+    sync_client.close()
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="End-to-end load test of the search API")
+    parser.add_argument('--tweets', type=int, default=20000)
+    parser.add_argument('--users', type=int, default=2000)
+    parser.add_argument('--requests', type=int, default=2000, help="Requests per run")
+    parser.add_argument('--concurrency', default='1,16,64', help="Comma separated numbers of concurrent clients")
+    parser.add_argument('--mix', default='', help="Request kind weights, e.g. filterby_text=5,hashtags=1")
+    parser.add_argument('--db-latency-ms', type=float, default=2.0, help="Round trip added to every fake query")
+    parser.add_argument('--mongodb-uri', default=os.getenv('BENCH_MONGODB_URI'),
+                        help="Serve tweets from a local mongod instead of the in-memory collection")
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--output', default='load_test.json', help="Where to write the JSON report, - for stdout")
+    parser.add_argument('--verbose', action='store_true', help="Keep the API's per-request log lines")
+    args = parser.parse_args()
+    mix = parse_mix(args.mix)
+    report_file = sys.stdout.buffer if args.output == '-' else None
+    if report_file is not None:
+        # The report owns stdout, the API's log lines and the table go to stderr
+        sys.stdout = sys.stderr
+    concurrency_levels = [int(level) for level in args.concurrency.split(',')]
+
+    users, tweets = make_corpus(args.tweets, args.users, args.seed)
+    latency = args.db_latency_ms / 1000
+    if args.mongodb_uri:
+        mongo_client = seed_mongodb(args.mongodb_uri, tweets)
+    else:
+        mongo_client = FakeMongoClient(FakeCollection(tweets, latency))
+    supabase = FakeSupabase({'users': users}, latency)
+
+    async def connect_to_supabase():
+        return supabase
+
+    # search.py connects when it is imported and in its lifespan, both go to the stand-ins
+    connections.connect_to_mongodb = lambda: mongo_client
+    connections.connect_to_supabase = connect_to_supabase
+    import search
+    if args.mongodb_uri:
+        search.tweets_collection = mongo_client[BENCHMARK_DATABASE]['tweets']
+
+    requests = make_requests(args.requests, mix, users, tweets, args.seed)
+    report = {
+        'benchmark': 'load_test',
+        'commit': git_commit(),
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+        'python': platform.python_version(),
+        'cpus': os.cpu_count(),
+        'config': {
+            'tweets': args.tweets, 'users': args.users, 'requests': args.requests, 'mix': mix,
+            'concurrency': concurrency_levels, 'db_latency_ms': args.db_latency_ms, 'seed': args.seed,
+            'tweets_backend': 'mongodb' if args.mongodb_uri else 'memory', 'users_backend': 'memory',
+            'env': {name: os.getenv(name) for name in ENV_SETTINGS if os.getenv(name) is not None},
+        },
+        'runs': [],
+    }
+
+    quiet = contextlib.nullcontext() if args.verbose else contextlib.redirect_stdout(open(os.devnull, 'w'))
+    transport = httpx.ASGITransport(app=search.app)
+    try:
+        async with search.app.router.lifespan_context(search.app), \
+                httpx.AsyncClient(transport=transport, base_url='http://benchmark') as client:
+            await wait_until_loaded(search)
+            print(f"{'clients':>8}{'phase':>7}{'req/s':>10}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'errors':>8}")
+            for concurrency in concurrency_levels:
+                reset_cache(search)
+                for phase in ('cold', 'warm'):
+                    with quiet:
+                        run = await run_requests(client, requests, concurrency)
+                    report['runs'].append({'concurrency': concurrency, 'phase': phase, **run})
+                    latencies = run['latency_ms']
+                    print(f"{concurrency:>8}{phase:>7}{run['throughput_rps']:>10.1f}{latencies['p50']:>9.2f}"
+                          f"{latencies['p95']:>9.2f}{latencies['p99']:>9.2f}{run['errors']:>8}")
+    finally:
+        if args.mongodb_uri:
+            drop_mongodb(args.mongodb_uri)
+
+    body = orjson.dumps(report, option=orjson.OPT_INDENT_2)
+    if report_file is not None:
+        report_file.write(body + b'\n')
+    else:
+        with open(args.output, 'wb') as output_file:
+            output_file.write(body)
+        print(f"Wrote {args.output}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,96 @@
+"""
+Objects/sec and bytes per object of the model layer: the slots dataclasses with the memoized
+date formatter in model/, against the previous plain classes that ran strptime + strftime per
+tweet and built users through a 9-tuple. Also times building and serializing a page of 50
+objects: orjson writes slots dataclasses field by field, which is slower than dumping a
+__dict__, but far less than what creating the objects saves.
+
+    python -m benchmarks.model_benchmark
+"""
+import sys
+import time
+from datetime import datetime
+
+import orjson
+
+from benchmarks.synthetic import make_corpus
+from model.Tweet import create_tweet_object, format_created_at
+from model.User import create_user_object
+
+
+class PlainTweet:
+    def __init__(self, user_name, user_id, created_at, text, retweet_count, likes_count, hashtags):
+        self.user_name = user_name
+        self.user_id = user_id
+        self.created_at = created_at
+        self.text = text
+        self.retweet_count = retweet_count
+        self.likes_count = likes_count
+        self.hashtags = hashtags
+
+
+class PlainUser:
+    def __init__(self, user_name, user_id, verified, description):
+        self.user_name = user_name
+        self.user_id = user_id
+        self.verified = verified
+        self.description = description
+
+
+def plain_tweet_object(tweet):
+    return PlainTweet(user_name=tweet["user_name"], user_id="@" + tweet["user_screen_name"],
+                      created_at=datetime.strptime(tweet["created_at"], "%Y-%m-%d %H:%M:%S").strftime(
+                          "%d %b, %Y %I:%M%p"),
+                      text=tweet["text"], retweet_count=tweet["retweet_count"], likes_count=tweet["likes_count"],
+                      hashtags=tweet["hashtag"])
+
+
+def plain_user_object(user_data):
+    user = (user_data.get('id'), user_data.get('name'), user_data.get('screen_name'), user_data.get('verified'),
+            user_data.get('location'), user_data.get('description'), user_data.get('followers_count'),
+            user_data.get('friends_count'), user_data.get('tweets_count'))
+    return PlainUser(user_name=user[1], user_id="@" + user[2], verified=user[3], description=user[5])
+
+
+def object_size(obj):
+    """The object itself plus its attribute dict, if it has one (the field values are shared)"""
+    return sys.getsizeof(obj) + (sys.getsizeof(obj.__dict__) if hasattr(obj, '__dict__') else 0)
+
+
+def objects_per_second(create, rows, repeat=5):
+    start_time = time.perf_counter()
+    for _ in range(repeat):
+        for row in rows:
+            create(row)
+    return repeat * len(rows) / (time.perf_counter() - start_time)
+
+
+def page_seconds(create, rows, serialize, repeat=2000):
+    """Building and serializing a page of 50 objects, what a cache miss does"""
+    page = rows[:50]
+    start_time = time.perf_counter()
+    for _ in range(repeat):
+        serialize([create(row) for row in page])
+    return (time.perf_counter() - start_time) / repeat
+
+
+def main():
+    users, tweets = make_corpus(100000, 20000)
+    format_created_at.cache_clear()
+    rows = [
+        ('tweet (plain class)', plain_tweet_object, tweets, lambda page: orjson.dumps(page, default=vars)),
+        ('tweet (slots dataclass)', create_tweet_object, tweets, orjson.dumps),
+        ('user (plain class, tuple)', plain_user_object, users, lambda page: orjson.dumps(page, default=vars)),
+        ('user (slots dataclass)', create_user_object, users, orjson.dumps),
+    ]
+    print(f"{'model':<28}{'objects/s':>12}{'bytes/object':>14}{'us per page of 50':>20}")
+    for name, create, source_rows, serialize in rows:
+        rate = objects_per_second(create, source_rows)
+        objects = [create(row) for row in source_rows[:1000]]
+        size = sum(object_size(obj) for obj in objects) / len(objects)
+        print(f"{name:<28}{rate:>12.0f}{size:>14.0f}{page_seconds(create, source_rows, serialize) * 1e6:>20.1f}")
+    print(f"created_at formatter cache: {format_created_at.cache_info()}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,56 @@
+"""
+Compare caching model objects with caching pre-serialized response bodies.
+
+Reports bytes per cache entry (as pickled into Redis) and time per cache hit, for
+result lists of the sizes served by /trendingtweets and /filterby.
+
+    python -m benchmarks.response_cache_benchmark
+"""
+import pickle
+import time
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+
+from benchmarks.synthetic import make_corpus
+from cache.response_cache import create_cached_response, to_response
+from model.Tweet import create_tweet_object
+
+
+def time_per_call(function, repeat):
+    start_time = time.perf_counter()
+    for _ in range(repeat):
+        function()
+    return (time.perf_counter() - start_time) / repeat
+
+
+def benchmark(result_size, repeat):
+    _, documents = make_corpus(result_size, max(result_size // 10, 1))
+    tweets = [create_tweet_object(document) for document in documents]
+
+    # Before: the cache holds the objects and FastAPI encodes them on every hit
+    objects_pickled = pickle.dumps(tweets)
+    memory_objects = time_per_call(lambda: JSONResponse(jsonable_encoder(tweets)), repeat)
+    redis_objects = time_per_call(lambda: JSONResponse(jsonable_encoder(pickle.loads(objects_pickled))), repeat)
+
+    rows = [('objects', len(objects_pickled), memory_objects, redis_objects)]
+    for compress in (False, True):
+        cached = create_cached_response(tweets, compress=compress)
+        cached_pickled = pickle.dumps(cached)
+        memory_cached = time_per_call(lambda: to_response(cached), repeat)
+        redis_cached = time_per_call(lambda: to_response(pickle.loads(cached_pickled)), repeat)
+        rows.append(('bytes+zlib' if compress else 'bytes', len(cached_pickled), memory_cached, redis_cached))
+
+    print(f"\n{result_size} tweets per entry")
+    print(f"{'mode':<12}{'bytes/entry':>14}{'memory hit (us)':>18}{'redis hit (us)':>18}")
+    for mode, size, memory_hit, redis_hit in rows:
+        print(f"{mode:<12}{size:>14}{memory_hit * 1e6:>18.1f}{redis_hit * 1e6:>18.1f}")
+
+
+def main():
+    for result_size, repeat in ((10, 2000), (100, 500), (1000, 50)):
+        benchmark(result_size, repeat)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+"""
+Latency of /filterby text searches: Mongo's $text index sorted by tweet_score against the
+in-process index in database/search_engine.py, on the same synthetic corpus. Before timing,
+every query's first pages from the index are checked against a brute-force ranking of all tweets.
+
+Needs a local mongod (the benchmark seeds its own database and drops it afterwards):
+
+    BENCH_MONGODB_URI=mongodb://localhost:27017 python -m benchmarks.search_engine_benchmark
+"""
+import asyncio
+import os
+import random
+import statistics
+import time
+from collections import Counter
+
+import pymongo
+from pymongo import AsyncMongoClient
+
+from benchmarks.synthetic import make_corpus, WORDS
+from database import tweets as tweet_queries
+from database.search_engine import SearchEngine, Query, decode_cursor as engine_cursor
+
+MONGODB_URI = os.getenv('BENCH_MONGODB_URI', 'mongodb://localhost:27017')
+DATABASE_NAME = 'twitter-benchmark'
+TWEET_COUNT = int(os.getenv('BENCH_TWEETS', '50000'))
+QUERY_COUNT = int(os.getenv('BENCH_QUERIES', '500'))
+
+
+def make_queries(rng):
+    """Single words, two word searches, phrases and prefixes"""
+    queries = []
+    for _ in range(QUERY_COUNT):
+        first, second = rng.sample(WORDS, 2)
+        queries.append(rng.choice([first, f"{first} {second}", f'"{first} {second}"', f"{first[:3]}*"]))
+    return queries
+
+
+def brute_force_search(engine, text):
+    """(rank, tweet_id) of every matching tweet, best first, scored one document at a time"""
+    query = Query(text)
+    terms = engine._query_terms(query)
+    idfs = {term: engine._idf(term) for term in terms}
+    ranked = []
+    for doc_id, doc in enumerate(engine.docs):
+        counts = Counter(engine._doc_tokens(doc))
+        tfs = {term: counts[term] for term in terms if counts[term]}
+        if tfs and engine._accepts(doc_id, query):
+            ranked.append((engine._rank(doc_id, tfs, idfs), doc["tweet_id"]))
+    return sorted(ranked, reverse=True)
+
+
+def check_rankings(engine, queries, limit=50, pages=2):
+    """The first pages of every query must match the brute-force ranking, rank ties allowed to swap"""
+    for text in queries:
+        expected = brute_force_search(engine, text)
+        found = []
+        after = None
+        for _ in range(pages):
+            page, cursor = engine.search(text, limit, after)
+            found.extend(doc["tweet_id"] for doc in page)
+            if cursor is None:
+                break
+            after = engine_cursor(cursor)
+        expected_ranks = [rank for rank, _ in expected[:len(found)]]
+        ranks = {tweet_id: rank for rank, tweet_id in expected}
+        found_ranks = [ranks.get(tweet_id) for tweet_id in found]
+        if len(found) != min(len(expected), limit * pages) or any(
+                rank is None or abs(rank - expected_rank) > 1e-9
+                for rank, expected_rank in zip(found_ranks, expected_ranks)):
+            raise AssertionError(f"{engine.ranking} ranking of {text!r} differs from the brute-force ranking")
+
+
+def report(name, latencies):
+    latencies = sorted(latencies)
+    p99 = latencies[int(len(latencies) * 0.99) - 1]
+    print(f"{name:<22}{statistics.median(latencies) * 1000:>10.3f}{p99 * 1000:>10.3f}"
+          f"{len(latencies) / sum(latencies):>12.1f}")
+
+
+async def main():
+    _, tweets = make_corpus(TWEET_COUNT, TWEET_COUNT // 10)
+    queries = make_queries(random.Random(7))
+
+    engines = {}
+    for ranking in ('score', 'bm25'):
+        start_time = time.perf_counter()
+        engine = SearchEngine(ranking=ranking)
+        engine.build(tweets)
+        print(f"Built the {ranking} index in {time.perf_counter() - start_time:.2f} seconds: {engine.stats()}")
+        check_rankings(engine, queries[:100])
+        engines[ranking] = engine
+
+    sync_client = pymongo.MongoClient(MONGODB_URI)
+    collection = sync_client[DATABASE_NAME]['tweets']
+    collection.drop()
+    collection.insert_many([dict(tweet) for tweet in tweets], ordered=False)
+    collection.create_index([("text", "text")])
+    async_client = AsyncMongoClient(MONGODB_URI)
+    async_collection = async_client[DATABASE_NAME]['tweets']
+
+    print(f"{'backend':<22}{'p50 ms':>10}{'p99 ms':>10}{'queries/s':>12}")
+
+    latencies = []
+    for query in queries:
+        # $text has no prefix queries, Mongo is sent the bare word instead
+        start_time = time.perf_counter()
+        await tweet_queries.search_tweets(async_collection, query.rstrip('*'))
+        latencies.append(time.perf_counter() - start_time)
+    report('mongo $text', latencies)
+
+    for ranking, engine in engines.items():
+        latencies = []
+        for query in queries:
+            start_time = time.perf_counter()
+            engine.search(query, 50)
+            latencies.append(time.perf_counter() - start_time)
+        report(f'index ({ranking})', latencies)
+
+    sync_client.drop_database(DATABASE_NAME)
+    sync_client.close()
+    await async_client.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,108 @@
+import json
+import random
+from datetime import datetime, timedelta
+
+WORDS = ['corona', 'virus', 'covid', 'lockdown', 'vaccine', 'health', 'news', 'stay', 'home', 'safe',
+         'mask', 'hospital', 'world', 'people', 'today', 'cases', 'update', 'china', 'italy', 'usa']
+HASHTAGS = ['COVID19', 'coronavirus', 'Corona', 'StayHome', 'lockdown', 'SocialDistancing', 'pandemic',
+            'WuhanVirus', 'CoronaOutbreak', 'StayAtHome']
+START_DATE = datetime(2020, 4, 1)
+
+
+def make_user(i, rng=random):
+    """A users table row, as written by user-data-processor-supabase.py"""
+    return {
+        'id': i + 1,
+        'user_id': str(1000000 + i),
+        'name': f"User {i}",
+        'screen_name': f"user_{i}_{rng.choice(WORDS)}",
+        'followers_count': int(rng.paretovariate(1.2) * 50),
+        'friends_count': rng.randint(0, 5000),
+        'tweets_count': rng.randint(1, 100000),
+        'verified': rng.random() < 0.02,
+        'created_at': (START_DATE - timedelta(days=rng.randint(0, 4000))).strftime("%Y-%m-%d %H:%M:%S"),
+        'description': ' '.join(rng.choice(WORDS) for _ in range(rng.randint(0, 15))),
+        'location': rng.choice(['', 'New York', 'London', 'Delhi', 'Rome']),
+        'profile_image_url': '',
+    }
+
+
+def make_tweet(i, user, rng=random):
+    """A tweets collection document, as written by the tweet data processor"""
+    retweet_count = int(rng.paretovariate(1.5)) - 1
+    likes_count = int(rng.paretovariate(1.3)) - 1
+    return {
+        'tweet_id': str(2000000 + i),
+        'text': ' '.join(rng.choice(WORDS) for _ in range(rng.randint(5, 20))),
+        'hashtag': rng.sample(HASHTAGS, rng.choice([0, 0, 1, 1, 2, 3])),
+        'user_id': user['user_id'],
+        'user_name': user['name'],
+        'user_screen_name': user['screen_name'],
+        'likes_count': likes_count,
+        'retweet_count': retweet_count,
+        'source_tweet_id': 0,
+        'tweet_score': 0.6 * retweet_count + 0.4 * likes_count,
+        'created_at': (START_DATE + timedelta(seconds=rng.randint(0, 30 * 86400))).strftime("%Y-%m-%d %H:%M:%S"),
+    }
+
+
+def make_corpus(tweet_count, user_count, seed=42):
+    """Return (users, tweets) with tweets spread over the users following a power law"""
+    rng = random.Random(seed)
+    users = [make_user(i, rng) for i in range(user_count)]
+    tweets = [make_tweet(i, users[min(int(rng.paretovariate(1.1)) - 1, user_count - 1)], rng)
+              for i in range(tweet_count)]
+    return users, tweets
+
+
+def api_created_at(created_at):
+    return datetime.strptime(created_at, "%Y-%m-%d %H:%M:%S").strftime("%a %b %d %H:%M:%S +0000 %Y")
+
+
+def make_api_user(user):
+    """A users table row as the user object of the Twitter API"""
+    return {
+        'id_str': user['user_id'],
+        'name': user['name'],
+        'screen_name': user['screen_name'],
+        'followers_count': user['followers_count'],
+        'friends_count': user['friends_count'],
+        'statuses_count': user['tweets_count'],
+        'verified': user['verified'],
+        'created_at': api_created_at(user['created_at']),
+        'description': user['description'],
+        'location': user['location'],
+        'profile_image_url': user['profile_image_url'],
+    }
+
+
+def make_api_tweet(tweet, user, retweeted_status=None):
+    """A tweets collection document as the Twitter API tweet it was loaded from"""
+    api_tweet = {
+        'id_str': tweet['tweet_id'],
+        'text': tweet['text'],
+        'entities': {'hashtags': [{'text': hashtag} for hashtag in tweet['hashtag']]},
+        'user': make_api_user(user),
+        'favorite_count': tweet['likes_count'],
+        'created_at': api_created_at(tweet['created_at']),
+    }
+    if retweeted_status is not None:
+        api_tweet['text'] = f"RT @{retweeted_status['user']['screen_name']}: {retweeted_status['text']}"
+        api_tweet['retweeted_status'] = retweeted_status
+    return api_tweet
+
+
+def make_raw_corpus(tweet_count, user_count, retweet_ratio=0.3, seed=42):
+    """Lines of a raw corpus file (one Twitter API tweet JSON per line), about retweet_ratio of them retweets"""
+    rng = random.Random(seed)
+    users, tweets = make_corpus(tweet_count, user_count, seed)
+    users_by_id = {user['user_id']: user for user in users}
+    # Only original tweets are retweeted, so retweets never nest
+    api_tweets = []
+    for tweet in tweets:
+        user = users_by_id[tweet['user_id']]
+        if api_tweets and rng.random() < retweet_ratio:
+            yield json.dumps(make_api_tweet(tweet, user, rng.choice(api_tweets)))
+        else:
+            api_tweets.append(make_api_tweet(tweet, user))
+            yield json.dumps(api_tweets[-1])
@@ -0,0 +1,66 @@
+"""
+Memory and serialization of large tweet results: a list of Tweet objects against the columnar
+TweetBatch in model/TweetBatch.py, for 200 and 10k tweets mostly by one user. Memory is what the
+result keeps alive once built (tracemalloc), which is what the in-process cache holds per hashtag
+result when CACHE_RESPONSES=false, pickled is the size of the entry Redis stores then.
+
+    python -m benchmarks.tweet_batch_benchmark
+"""
+import pickle
+import time
+import tracemalloc
+
+import orjson
+
+from benchmarks.synthetic import make_corpus
+from model.Tweet import create_tweet_object
+from model.TweetBatch import TweetBatch
+
+
+def build_objects(documents):
+    return [create_tweet_object(document) for document in documents]
+
+
+def retained_bytes(build, documents):
+    # The formatted dates are memoized either way, warm the cache so only the result itself is measured
+    build(documents)
+    tracemalloc.start()
+    result = build(documents)
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del result
+    return size
+
+
+def build_and_serialize_seconds(build, serialize, documents, repeat):
+    """Best of repeat runs, the shared machines these run on are noisy"""
+    best = float('inf')
+    for _ in range(repeat):
+        start_time = time.perf_counter()
+        serialize(build(documents))
+        best = min(best, time.perf_counter() - start_time)
+    return best
+
+
+def main():
+    users, tweets = make_corpus(200000, 20000)
+    # The most active users first, like the results of a prolific account
+    by_user = sorted(tweets, key=lambda tweet: int(tweet['user_id']))
+    variants = [
+        ('Tweet objects', build_objects, orjson.dumps),
+        ('TweetBatch', TweetBatch.from_documents, TweetBatch.to_json),
+    ]
+    print(f"{'result':<14}{'tweets':>8}{'kB retained':>13}{'kB pickled':>12}{'ms build+json':>15}")
+    for count, repeat in ((200, 200), (10000, 20)):
+        documents = by_user[:count]
+        expected = orjson.dumps(build_objects(documents))
+        for name, build, serialize in variants:
+            assert serialize(build(documents)) == expected
+            size = retained_bytes(build, documents)
+            pickled = len(pickle.dumps(build(documents)))
+            seconds = build_and_serialize_seconds(build, serialize, documents, repeat)
+            print(f"{name:<14}{count:>8}{size / 1024:>13.1f}{pickled / 1024:>12.1f}{seconds * 1e3:>15.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,197 @@
+import os
+import pickle
+import queue
+import struct
+import threading
+import time
+import zlib
+
+# Every checkpoint file starts with the magic string followed by a one byte format version.
+# Files without it are legacy checkpoints holding a single pickled (cache, access_count) tuple.
+MAGIC = b'TWCACHE'
+FORMAT_VERSION = 1
+HEADER = MAGIC + bytes([FORMAT_VERSION])
+
+# Each record is framed as <payload length><crc32 of payload><payload>
+RECORD_HEADER = struct.Struct('<II')
+
+PUT = 'put'
+DELETE = 'del'
+COUNTS = 'counts'
+
+
+def encode_record(record):
+    payload = pickle.dumps(record, protocol=pickle.HIGHEST_PROTOCOL)
+    return RECORD_HEADER.pack(len(payload), zlib.crc32(payload)) + payload
+
+
+def iter_records(path):
+    """
+    Stream the records of a checkpoint or journal file. Reading stops quietly at the first
+    truncated or corrupt record, which is what a crash in the middle of an append leaves behind.
+    """
+    with open(path, 'rb') as f:
+        header = f.read(len(HEADER))
+        if header[:len(MAGIC)] != MAGIC:
+            raise ValueError(f"{path} is not a versioned checkpoint")
+        if header[len(MAGIC)] != FORMAT_VERSION:
+            raise ValueError(f"Unsupported checkpoint version {header[len(MAGIC)]} in {path}")
+        while True:
+            record_header = f.read(RECORD_HEADER.size)
+            if len(record_header) < RECORD_HEADER.size:
+                return
+            length, checksum = RECORD_HEADER.unpack(record_header)
+            payload = f.read(length)
+            if len(payload) < length or zlib.crc32(payload) != checksum:
+                print(f"Ignoring torn record at the end of {path}")
+                return
+            yield pickle.loads(payload)
+
+
+def is_versioned_checkpoint(path):
+    with open(path, 'rb') as f:
+        return f.read(len(MAGIC)) == MAGIC
+
+
+def apply_records(records, cache, access_count):
+    """Replay records into a key -> {'value', 'timestamp'} dict and a key -> count dict"""
+    for record in records:
+        op = record[0]
+        if op == PUT:
+            _, key, timestamp, value = record
+            cache[key] = {'value': value, 'timestamp': timestamp}
+        elif op == DELETE:
+            cache.pop(record[1], None)
+            access_count.pop(record[1], None)
+        elif op == COUNTS:
+            access_count.clear()
+            access_count.update(record[1])
+
+
+def load_snapshot(checkpoint_file, cache, access_count):
+    if is_versioned_checkpoint(checkpoint_file):
+        apply_records(iter_records(checkpoint_file), cache, access_count)
+    else:
+        with open(checkpoint_file, 'rb') as f:
+            legacy_cache, legacy_access_count = pickle.load(f)
+        cache.update(legacy_cache)
+        access_count.update(legacy_access_count)
+
+
+def load_checkpoint(checkpoint_file, journal_file):
+    """
+    Load the last snapshot and replay the journal written after it. A snapshot that cannot be read
+    is moved aside to <checkpoint_file>.corrupt and the journal is still replayed on its own.
+    A journal that breaks off keeps the records read before the error.
+    """
+    cache = {}
+    access_count = {}
+    if os.path.exists(checkpoint_file):
+        try:
+            load_snapshot(checkpoint_file, cache, access_count)
+        except Exception as e:
+            print(f"Error reading cache snapshot, moving it to {checkpoint_file}.corrupt: {e}")
+            cache.clear()
+            access_count.clear()
+            os.replace(checkpoint_file, checkpoint_file + '.corrupt')
+    if os.path.exists(journal_file):
+        try:
+            apply_records(iter_records(journal_file), cache, access_count)
+        except Exception as e:
+            print(f"Error replaying cache journal, keeping the records read before the error: {e}")
+    return cache, access_count
+
+
+def write_snapshot(checkpoint_file, cache, access_count):
+    """Write a full snapshot atomically: a temp file is written, synced and renamed over the old one"""
+    temp_file = checkpoint_file + '.tmp'
+    with open(temp_file, 'wb') as f:
+        f.write(HEADER)
+        for key, entry in cache.items():
+            f.write(encode_record((PUT, key, entry['timestamp'], entry['value'])))
+        f.write(encode_record((COUNTS, access_count)))
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temp_file, checkpoint_file)
+
+
+class CheckpointWriter(threading.Thread):
+    """
+    Background thread that persists cache changes. Request threads only enqueue records,
+    the thread appends them to a journal and periodically compacts snapshot + journal
+    into a new snapshot without touching the live cache.
+    """
+
+    def __init__(self, checkpoint_file, journal_file, flush_interval=1, compact_after=10000):
+        super().__init__(name='cache-checkpoint-writer', daemon=True)
+        self.checkpoint_file = checkpoint_file
+        self.journal_file = journal_file
+        self.flush_interval = flush_interval
+        # Number of journal records after which the journal is folded into the snapshot
+        self.compact_after = compact_after
+        self.records = queue.Queue()
+        self.journal = None
+        self.journal_records = 0
+        self.stopped = threading.Event()
+        self.failed = False
+
+    def append(self, record):
+        if not self.failed:
+            self.records.put(record)
+
+    def _open_journal(self, truncate=False):
+        exists = os.path.exists(self.journal_file) and not truncate
+        self.journal = open(self.journal_file, 'ab' if exists else 'wb')
+        if not exists:
+            self.journal.write(HEADER)
+            self.journal.flush()
+
+    def compact(self):
+        """Fold the journal into a new snapshot and start an empty journal"""
+        self.journal.flush()
+        cache, access_count = load_checkpoint(self.checkpoint_file, self.journal_file)
+        write_snapshot(self.checkpoint_file, cache, access_count)
+        # A crash before the journal is reset only means its records are replayed twice,
+        # which is harmless since every record carries the full state of its key
+        self.journal.close()
+        self._open_journal(truncate=True)
+        self.journal_records = 0
+
+    def run(self):
+        try:
+            self._open_journal()
+            if self.journal.tell() > len(HEADER) or not os.path.exists(self.checkpoint_file):
+                # Fold a journal left over by the previous run into the snapshot first,
+                # this also drops a torn tail so new records are never appended after it.
+                # Without a snapshot (first run, or the last one was unreadable) a fresh one is written.
+                self.compact()
+        except Exception as e:
+            print(f"Error opening cache journal, checkpointing is disabled: {e}")
+            self.failed = True
+            return
+        last_flush = time.time()
+        while not (self.stopped.is_set() and self.records.empty()):
+            try:
+                record = self.records.get(timeout=self.flush_interval)
+            except queue.Empty:
+                record = None
+            try:
+                if record is not None:
+                    self.journal.write(encode_record(record))
+                    self.journal_records += 1
+                if time.time() - last_flush > self.flush_interval:
+                    self.journal.flush()
+                    last_flush = time.time()
+                if self.journal_records >= self.compact_after:
+                    self.compact()
+            except Exception as e:
+                print(f"Error writing cache checkpoint: {e}")
+        self.journal.flush()
+        os.fsync(self.journal.fileno())
+        self.journal.close()
+
+    def close(self):
+        """Write out everything that is still queued and stop the thread"""
+        self.stopped.set()
+        if self.is_alive():
+            self.join()
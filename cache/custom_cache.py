@@ -1,89 +1,162 @@
+import asyncio
+import atexit
 import time
-import pickle
-import os
+
+from cache.eviction import create_policy
+from cache.key_index import KeyIndex, key_namespace, normalize_key
+from cache.expiry import ExpiryHeap
+from cache.checkpoint import CheckpointWriter, load_checkpoint, write_snapshot, PUT, DELETE, COUNTS
+from monitoring.metrics import CACHE_LOOKUPS, CACHE_EVICTIONS
 
 
 class Cache:
-    def __init__(self, max_size=10000, evict_strategy='least_accessed', checkpoint_interval=300, ttl=None):
+    def __init__(self, max_size=10000, evict_strategy='least_accessed', checkpoint_interval=300, ttl=None,
+                 match_modes=None, expire_batch_size=64, checkpoint_file='cache/cache.checkpoint', name='memory'):
+        if max_size < 1:
+            raise ValueError(f"max_size must be at least 1, got {max_size}")
         self.max_size = max_size
+        # Label of this cache in the /metrics counters
+        self.name = name
         self.evict_strategy = evict_strategy
         self.checkpoint_interval = checkpoint_interval
         self.ttl = ttl
         self.cache = {}
-        self.access_count = {}
+        self.policy = create_policy(evict_strategy)
+        # match_modes overrides how keys are matched per namespace ('exact', 'prefix' or 'substring')
+        self.key_index = KeyIndex(match_modes)
+        self.expiry = ExpiryHeap()
+        # Maximum number of expired entries swept per put or per sweep batch, the rest is left for later calls
+        self.expire_batch_size = expire_batch_size
+        self.stats = {'hits': 0, 'misses': 0, 'expired': 0, 'evicted': 0}
         self.last_checkpoint = time.time()
 
-        if os.path.exists('cache/cache.checkpoint'):
-            self.load_from_checkpoint('cache/cache.checkpoint')
+        # Changes are journaled by a background thread, requests never write to disk themselves.
+        # Passing checkpoint_file=None keeps the cache purely in memory.
+        self.checkpoint_writer = None
+        if checkpoint_file is not None:
+            self.load_from_checkpoint(checkpoint_file)
+            self.checkpoint_writer = CheckpointWriter(checkpoint_file, checkpoint_file + '.journal')
+            self.checkpoint_writer.start()
+            atexit.register(self.checkpoint_writer.close)
+
+    @property
+    def access_count(self):
+        return self.policy.access_counts()
 
     def load_from_checkpoint(self, checkpoint_file):
-        with open(checkpoint_file, 'rb') as f:
-            self.cache, self.access_count = pickle.load(f)
+        try:
+            self.cache, access_count = load_checkpoint(checkpoint_file, checkpoint_file + '.journal')
+        except Exception as e:
+            print(f"Error loading cache checkpoint: {e}")
+            self.cache, access_count = {}, {}
+        # Replay the entries oldest first so the policy order matches insertion order
+        for key in sorted(self.cache, key=lambda k: self.cache[k]['timestamp']):
+            self.policy.on_insert(key, access_count.get(key, 0))
+            self.key_index.add(key)
+            if self.ttl is not None:
+                self.expiry.push(key, self.cache[key]['timestamp'])
 
     def save_to_checkpoint(self, checkpoint_file):
-        with open(checkpoint_file, 'wb') as f:
-            pickle.dump((self.cache, self.access_count), f)
+        write_snapshot(checkpoint_file, self.cache, self.access_count)
+
+    def _remove(self, key):
+        del self.cache[key]
+        self.policy.on_remove(key)
+        self.key_index.remove(key)
+        if self.checkpoint_writer is not None:
+            self.checkpoint_writer.append((DELETE, key))
+
+    def delete(self, key):
+        key = normalize_key(key)
+        if key in self.cache:
+            self._remove(key)
+
+    def _is_expired(self, key, current_time):
+        return self.ttl is not None and (current_time - self.cache[key]['timestamp']) > self.ttl
 
     def get(self, key):
-        # Clean up expired items
-        self.expire_items()
-        if key[0].isdigit() or key.startswith('#'):
-            if key not in self.cache:
-                return None
-            similar_keys = [key]
-
-        else:
-            similar_keys = []
-            for k in self.cache:
-                if key in k:
-                    similar_keys.append(k)
-
-            if len(similar_keys) == 0:
-                return None
-
-        if self.ttl is not None and (time.time() - self.cache[key]['timestamp']) > self.ttl:
-            del self.cache[key]
-            del self.access_count[key]
+        key = normalize_key(key)
+        similar_keys = self.key_index.lookup(key)
+
+        # Expire lazily, only the entries this lookup is about to return are checked
+        if self.ttl is not None and similar_keys:
+            current_time = time.time()
+            expired_keys = [k for k in similar_keys if self._is_expired(k, current_time)]
+            for k in expired_keys:
+                self._remove(k)
+                self.stats['expired'] += 1
+            if expired_keys:
+                similar_keys = [k for k in similar_keys if k in self.cache]
+
+        if len(similar_keys) == 0:
+            self.stats['misses'] += 1
+            CACHE_LOOKUPS.labels(self.name, key_namespace(key), 'miss').inc()
             return None
+        self.stats['hits'] += 1
+        CACHE_LOOKUPS.labels(self.name, key_namespace(key), 'hit').inc()
 
         for i in similar_keys:
-            self.access_count[i] += 1
-
-            if self.evict_strategy == 'least_accessed':
-                least_accessed_key = min(self.access_count, key=self.access_count.get)
-                if len(self.cache) > self.max_size and key != least_accessed_key:
-                    del self.cache[least_accessed_key]
-                    del self.access_count[least_accessed_key]
+            self.policy.on_access(i)
 
         return [self.cache[k]['value'] for k in similar_keys]
 
     def put(self, key, value):
-        if not key.startswith('#'):
-            key = key.lower()
-        self.cache[key] = {'value': value, 'timestamp': time.time()}
-        self.access_count[key] = 0
-        if len(self.cache) > self.max_size:
-            if self.evict_strategy == 'least_accessed':
-                least_accessed_key = min(self.access_count, key=self.access_count.get)
-                del self.cache[least_accessed_key]
-                del self.access_count[least_accessed_key]
-            elif self.evict_strategy == 'oldest':
-                oldest_key = min(self.cache, key=lambda k: self.cache[k]['timestamp'])
-                del self.cache[oldest_key]
-                del self.access_count[oldest_key]
-
-        if (time.time() - self.last_checkpoint) > self.checkpoint_interval:
-            cache_file_path = os.path.join('cache/', 'cache.checkpoint')
-            self.save_to_checkpoint(cache_file_path)
-            self.last_checkpoint = time.time()
-
-    def expire_items(self):
-        if self.ttl:
-            current_time = time.time()
-            expired_keys = [key for key, val in self.cache.items() if (current_time - val['timestamp']) > self.ttl]
-            for key in expired_keys:
-                del self.cache[key]
-                del self.access_count[key]
+        key = normalize_key(key)
+        self.expire_items(limit=self.expire_batch_size)
+        if key not in self.cache:
+            # Make room before inserting so the new entry is never its own victim
+            while len(self.cache) >= self.max_size:
+                victim = self.policy.victim()
+                if victim is None:
+                    # The policy lost track of the remaining entries, insert over the limit rather than fail
+                    break
+                self._remove(victim)
+                self.stats['evicted'] += 1
+                CACHE_EVICTIONS.labels(self.name, key_namespace(victim)).inc()
+        timestamp = time.time()
+        self.cache[key] = {'value': value, 'timestamp': timestamp}
+        self.policy.on_insert(key)
+        self.key_index.add(key)
+        if self.ttl is not None:
+            self.expiry.push(key, timestamp)
+
+        if self.checkpoint_writer is not None:
+            self.checkpoint_writer.append((PUT, key, timestamp, value))
+            if (time.time() - self.last_checkpoint) > self.checkpoint_interval:
+                # Access counts change on every hit, so they are only journaled periodically
+                self.checkpoint_writer.append((COUNTS, self.access_count))
+                self.last_checkpoint = time.time()
+
+    # The in-memory cache never waits on I/O, the async methods only let callers use
+    # every cache backend the same way
+    async def aget(self, key):
+        return self.get(key)
+
+    async def aput(self, key, value):
+        self.put(key, value)
+
+    def expire_items(self, limit=None):
+        """Remove expired entries in timestamp order, examining at most `limit` of them"""
+        if self.ttl is None:
+            return
+        for key in self.expiry.pop_expired(self.cache, time.time() - self.ttl, limit):
+            self._remove(key)
+            self.stats['expired'] += 1
+
+    async def sweep_expired(self):
+        """Remove every expired entry, expire_batch_size at a time, letting requests run between batches"""
+        while self.ttl is not None and self.expiry.has_expired(time.time() - self.ttl):
+            self.expire_items(limit=self.expire_batch_size)
+            await asyncio.sleep(0)
+
+    def get_cache_stats(self):
+        lookups = self.stats['hits'] + self.stats['misses']
+        return {
+            **self.stats,
+            'hit_ratio': self.stats['hits'] / lookups if lookups else 0.0,
+            'cache_size': len(self.cache),
+            'max_size': self.max_size,
+        }
 
     def print_cache(self):
         print('Cache:')
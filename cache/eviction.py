@@ -0,0 +1,174 @@
+from collections import OrderedDict
+
+
+class EvictionPolicy:
+    """
+    Base class for cache eviction policies. The cache notifies the policy of every
+    insert, access and removal and asks it for a victim when it is full.
+    Every hook is expected to run in O(1).
+    """
+
+    def on_insert(self, key, frequency=0):
+        raise NotImplementedError
+
+    def on_access(self, key):
+        raise NotImplementedError
+
+    def on_remove(self, key):
+        raise NotImplementedError
+
+    def victim(self):
+        """Return the key that should be evicted next, or None if the policy is empty"""
+        raise NotImplementedError
+
+    def access_counts(self):
+        """Return a key -> access count mapping (used for checkpoints)"""
+        return {}
+
+    def __len__(self):
+        raise NotImplementedError
+
+
+class LRUPolicy(EvictionPolicy):
+    """Least recently used: an ordered dict with the most recently used key at the end"""
+
+    def __init__(self):
+        self.order = OrderedDict()
+
+    def on_insert(self, key, frequency=0):
+        self.order[key] = frequency
+        self.order.move_to_end(key)
+
+    def on_access(self, key):
+        if key in self.order:
+            self.order[key] += 1
+            self.order.move_to_end(key)
+
+    def on_remove(self, key):
+        self.order.pop(key, None)
+
+    def victim(self):
+        return next(iter(self.order), None)
+
+    def access_counts(self):
+        return dict(self.order)
+
+    def __len__(self):
+        return len(self.order)
+
+
+class FIFOPolicy(EvictionPolicy):
+    """Oldest entry first: insertion order only, accesses do not change the order"""
+
+    def __init__(self):
+        self.order = OrderedDict()
+
+    def on_insert(self, key, frequency=0):
+        # Re-inserting a key refreshes its timestamp, so it moves to the back of the queue
+        self.order.pop(key, None)
+        self.order[key] = frequency
+
+    def on_access(self, key):
+        if key in self.order:
+            self.order[key] += 1
+
+    def on_remove(self, key):
+        self.order.pop(key, None)
+
+    def victim(self):
+        return next(iter(self.order), None)
+
+    def access_counts(self):
+        return dict(self.order)
+
+    def __len__(self):
+        return len(self.order)
+
+
+class LFUPolicy(EvictionPolicy):
+    """
+    Least frequently used with frequency buckets. Each bucket is an ordered dict so ties
+    are broken by recency (the least recently touched key in the lowest bucket goes first).
+    """
+
+    def __init__(self):
+        self.frequencies = {}
+        self.buckets = {}
+        self.min_frequency = None
+
+    def _add_to_bucket(self, key, frequency):
+        bucket = self.buckets.get(frequency)
+        if bucket is None:
+            bucket = self.buckets[frequency] = OrderedDict()
+        bucket[key] = None
+
+    def _remove_from_bucket(self, key, frequency):
+        bucket = self.buckets[frequency]
+        del bucket[key]
+        if not bucket:
+            del self.buckets[frequency]
+            if frequency == self.min_frequency:
+                # Only arbitrary removals can leave us without a known minimum,
+                # it is recomputed lazily over the (small) set of distinct frequencies
+                self.min_frequency = None
+
+    def on_insert(self, key, frequency=0):
+        if key in self.frequencies:
+            self._remove_from_bucket(key, self.frequencies[key])
+        self.frequencies[key] = frequency
+        self._add_to_bucket(key, frequency)
+        if self.min_frequency is None or frequency < self.min_frequency:
+            self.min_frequency = frequency
+
+    def on_access(self, key):
+        frequency = self.frequencies.get(key)
+        if frequency is None:
+            return
+        emptied_min = frequency == self.min_frequency and len(self.buckets[frequency]) == 1
+        self._remove_from_bucket(key, frequency)
+        self.frequencies[key] = frequency + 1
+        self._add_to_bucket(key, frequency + 1)
+        if emptied_min:
+            self.min_frequency = frequency + 1
+
+    def on_remove(self, key):
+        frequency = self.frequencies.pop(key, None)
+        if frequency is not None:
+            self._remove_from_bucket(key, frequency)
+
+    def victim(self):
+        if not self.frequencies:
+            return None
+        if self.min_frequency is None:
+            self.min_frequency = min(self.buckets)
+        return next(iter(self.buckets[self.min_frequency]))
+
+    def access_counts(self):
+        return dict(self.frequencies)
+
+    def __len__(self):
+        return len(self.frequencies)
+
+
+# Maps the evict_strategy names accepted by Cache to policy classes
+EVICTION_POLICIES = {
+    'least_accessed': LFUPolicy,
+    'least_recent': LRUPolicy,
+    'oldest': FIFOPolicy,
+}
+
+
+def register_policy(name, policy_class):
+    """Make a new eviction policy available as an evict_strategy"""
+    if not issubclass(policy_class, EvictionPolicy):
+        raise TypeError(f"{policy_class} is not an EvictionPolicy")
+    EVICTION_POLICIES[name] = policy_class
+
+
+def create_policy(evict_strategy):
+    if isinstance(evict_strategy, EvictionPolicy):
+        return evict_strategy
+    policy_class = EVICTION_POLICIES.get(evict_strategy)
+    if policy_class is None:
+        raise ValueError(f"Unknown evict strategy: {evict_strategy}")
+    return policy_class()
@@ -0,0 +1,42 @@
+import heapq
+
+
+class ExpiryHeap:
+    """
+    Min-heap of (timestamp, key) used to find expired cache entries without scanning the cache.
+    Overwritten entries leave stale heap items behind, they are skipped when popped because
+    their timestamp no longer matches the one stored in the cache.
+    """
+
+    def __init__(self):
+        self.heap = []
+
+    def push(self, key, timestamp):
+        heapq.heappush(self.heap, (timestamp, key))
+
+    def pop_expired(self, cache, deadline, limit=None):
+        """
+        Pop and return the keys of entries stored at or before the deadline.
+        At most `limit` heap items are examined, so callers can spread the work across requests.
+        """
+        expired = []
+        examined = 0
+        while self.heap and self.heap[0][0] <= deadline:
+            if limit is not None and examined >= limit:
+                break
+            timestamp, key = heapq.heappop(self.heap)
+            examined += 1
+            entry = cache.get(key)
+            if entry is not None and entry['timestamp'] == timestamp:
+                expired.append(key)
+        return expired
+
+    def has_expired(self, deadline):
+        """Whether an item stored at or before the deadline is waiting to be popped (it may be stale)"""
+        return bool(self.heap) and self.heap[0][0] <= deadline
+
+    def clear(self):
+        self.heap = []
+
+    def __len__(self):
+        return len(self.heap)
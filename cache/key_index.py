@@ -0,0 +1,182 @@
+from bisect import bisect_left, insort
+
+
+PAGE_KEY_PREFIX = 'page:'
+
+
+def page_cache_key(*parts):
+    """Key for one page of a paginated result, these are only ever matched exactly"""
+    return PAGE_KEY_PREFIX + ':'.join(str(part) for part in parts)
+
+
+def normalize_key(key):
+    """
+    Lookups are case-insensitive, except for hashtags and page keys: screen names are matched
+    case-sensitively by Mongo and cursors are opaque, so folding them would merge different pages
+    """
+    if key.startswith('#') or key.startswith(PAGE_KEY_PREFIX):
+        return key
+    return key.lower()
+
+
+def key_namespace(key):
+    """Classify a cache key by the shape of the request that produced it"""
+    if key.startswith(PAGE_KEY_PREFIX):
+        return 'page'
+    if key.startswith('#'):
+        return 'hashtag'
+    if key.startswith('@'):
+        return 'user'
+    if key[:1].isdigit():
+        return 'id'
+    if key.startswith('trending'):
+        return 'trending'
+    return 'text'
+
+
+def ngrams(text, size):
+    return {text[i:i + size] for i in range(len(text) - size + 1)}
+
+
+def all_ngrams(text, max_size):
+    """All grams of length 1 to max_size, this is what gets indexed for every key"""
+    grams = set()
+    for size in range(1, min(max_size, len(text)) + 1):
+        grams |= ngrams(text, size)
+    return grams
+
+
+def query_ngrams(text, max_size):
+    """The grams a substring query has to match: the longest indexed size that fits in the query"""
+    return ngrams(text, min(max_size, len(text)))
+
+
+# Match mode used for each namespace unless the cache is told otherwise
+DEFAULT_MATCH_MODES = {
+    'hashtag': 'exact',
+    'id': 'exact',
+    'trending': 'exact',
+    'page': 'exact',
+    'user': 'substring',
+    'text': 'substring',
+}
+
+
+class ExactIndex:
+    def __init__(self):
+        self.keys = set()
+
+    def add(self, key):
+        self.keys.add(key)
+
+    def remove(self, key):
+        self.keys.discard(key)
+
+    def lookup(self, key):
+        return [key] if key in self.keys else []
+
+
+class PrefixIndex:
+    """Keeps the keys sorted so that all keys sharing a prefix form a contiguous run"""
+
+    def __init__(self):
+        self.keys = []
+        self.members = set()
+
+    def add(self, key):
+        if key not in self.members:
+            self.members.add(key)
+            insort(self.keys, key)
+
+    def remove(self, key):
+        if key in self.members:
+            self.members.remove(key)
+            del self.keys[bisect_left(self.keys, key)]
+
+    def lookup(self, key):
+        matches = []
+        i = bisect_left(self.keys, key)
+        while i < len(self.keys) and self.keys[i].startswith(key):
+            matches.append(self.keys[i])
+            i += 1
+        return matches
+
+
+class SubstringIndex:
+    """
+    N-gram index (grams of length 1 to gram_size) mapping every gram to the keys containing it.
+    A lookup intersects the posting sets of the query's grams, starting from the smallest one,
+    and only runs the containment check on the surviving candidates.
+    """
+
+    def __init__(self, gram_size=3):
+        self.gram_size = gram_size
+        self.postings = {}
+
+    def add(self, key):
+        for gram in all_ngrams(key, self.gram_size):
+            postings = self.postings.get(gram)
+            if postings is None:
+                postings = self.postings[gram] = set()
+            postings.add(key)
+
+    def remove(self, key):
+        for gram in all_ngrams(key, self.gram_size):
+            postings = self.postings.get(gram)
+            if postings is not None:
+                postings.discard(key)
+                if not postings:
+                    del self.postings[gram]
+
+    def lookup(self, key):
+        posting_sets = []
+        for gram in query_ngrams(key, self.gram_size):
+            postings = self.postings.get(gram)
+            if postings is None:
+                return []
+            posting_sets.append(postings)
+        posting_sets.sort(key=len)
+        candidates = posting_sets[0]
+        for postings in posting_sets[1:]:
+            candidates = candidates & postings
+            if not candidates:
+                return []
+        if len(key) <= self.gram_size:
+            # The query is itself one of the indexed grams
+            return list(candidates)
+        return [k for k in candidates if key in k]
+
+
+MATCH_INDEXES = {
+    'exact': ExactIndex,
+    'prefix': PrefixIndex,
+    'substring': SubstringIndex,
+}
+
+
+class KeyIndex:
+    """Routes every key to the index of its namespace, according to the configured match modes"""
+
+    def __init__(self, match_modes=None):
+        self.match_modes = dict(DEFAULT_MATCH_MODES)
+        if match_modes:
+            self.match_modes.update(match_modes)
+        self.indexes = {}
+        for namespace, mode in self.match_modes.items():
+            if mode not in MATCH_INDEXES:
+                raise ValueError(f"Unknown match mode for namespace {namespace}: {mode}")
+            self.indexes[namespace] = MATCH_INDEXES[mode]()
+
+    def add(self, key):
+        self.indexes[key_namespace(key)].add(key)
+
+    def remove(self, key):
+        self.indexes[key_namespace(key)].remove(key)
+
+    def lookup(self, key):
+        """Return the matching keys, with the exact key (if cached) first"""
+        matches = self.indexes[key_namespace(key)].lookup(key)
+        if len(matches) > 1 and key in matches:
+            matches.remove(key)
+            matches.insert(0, key)
+        return matches
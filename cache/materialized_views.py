@@ -0,0 +1,114 @@
+import asyncio
+import time
+from datetime import datetime, timezone
+
+from fastapi.responses import Response
+
+from cache.response_cache import create_cached_response
+
+
+class MaterializedView:
+    """
+    A result list that is recomputed in the background and kept in memory as a serialized body,
+    so the endpoint serving it never queries the database.
+    """
+
+    def __init__(self, name, loader, refresh_interval=60):
+        self.name = name
+        self.loader = loader
+        self.refresh_interval = refresh_interval
+        self.cached_response = None
+        self.refreshed_at = None
+        self.last_error = None
+        self.ready = asyncio.Event()
+        self.wake = asyncio.Event()
+
+    async def refresh(self):
+        items = await self.loader()
+        self.cached_response = create_cached_response(items)
+        self.refreshed_at = time.time()
+        self.last_error = None
+        self.ready.set()
+
+    def age(self, now=None):
+        return (now or time.time()) - self.refreshed_at if self.refreshed_at is not None else None
+
+    def is_stale(self, now=None):
+        """A view is stale once it missed a refresh, e.g. because the database was unreachable"""
+        age = self.age(now)
+        return age is None or age > 2 * self.refresh_interval
+
+    def staleness_headers(self, now=None):
+        now = now or time.time()
+        return {
+            "X-Refreshed-At": datetime.fromtimestamp(self.refreshed_at, timezone.utc).isoformat(),
+            "X-Data-Age": str(int(self.age(now))),
+            "X-Stale": "true" if self.is_stale(now) else "false",
+        }
+
+    def to_response(self):
+        return Response(content=self.cached_response.json_bytes(), media_type='application/json',
+                        headers=self.staleness_headers())
+
+
+class ViewRefresher:
+    """
+    Refreshes every registered view on its own schedule from background tasks.
+    trigger(name) refreshes a view right away, for writers that know its data changed.
+    """
+
+    def __init__(self):
+        self.views = {}
+        self.tasks = []
+
+    def register(self, name, loader, refresh_interval=60):
+        self.views[name] = MaterializedView(name, loader, refresh_interval)
+        return self.views[name]
+
+    def start(self):
+        self.tasks = [asyncio.create_task(self._run(view)) for view in self.views.values()]
+
+    async def stop(self):
+        for task in self.tasks:
+            task.cancel()
+        await asyncio.gather(*self.tasks, return_exceptions=True)
+        self.tasks = []
+
+    def trigger(self, name):
+        self.views[name].wake.set()
+
+    async def _run(self, view):
+        while True:
+            view.wake.clear()
+            try:
+                await view.refresh()
+            except Exception as e:
+                view.last_error = str(e)
+                print(f"Error refreshing {view.name}: {e}")
+            try:
+                await asyncio.wait_for(view.wake.wait(), timeout=view.refresh_interval)
+            except asyncio.TimeoutError:
+                pass
+
+    async def wait_ready(self, name, timeout=10):
+        """
+        The view once it has been refreshed at least once. Right after startup this waits for the
+        first refresh instead of querying the database itself, returns None if it does not finish in time.
+        """
+        view = self.views[name]
+        if not view.ready.is_set():
+            try:
+                await asyncio.wait_for(view.ready.wait(), timeout=timeout)
+            except asyncio.TimeoutError:
+                return None
+        return view
+
+    async def response(self, name, timeout=10):
+        """The latest body of a view with its staleness headers"""
+        view = await self.wait_ready(name, timeout)
+        return view.to_response() if view is not None else None
+
+    def status(self):
+        return {name: {"refreshed_at": view.refreshed_at, "age": view.age(), "stale": view.is_stale(),
+                       "last_error": view.last_error}
+                for name, view in self.views.items()}
@@ -0,0 +1,62 @@
+import zlib
+
+import orjson
+from fastapi.responses import Response
+
+
+class CachedResponse:
+    """
+    A response body serialized once, when the entry is cached. Cache hits hand the bytes
+    back as they are, without pickling the model objects or running jsonable_encoder on them.
+    """
+
+    __slots__ = ('body', 'compressed', 'headers')
+
+    def __init__(self, body, compressed=False, headers=None):
+        self.body = body
+        self.compressed = compressed
+        self.headers = headers
+
+    def __len__(self):
+        return len(self.body)
+
+    def json_bytes(self):
+        return zlib.decompress(self.body) if self.compressed else self.body
+
+    def __getstate__(self):
+        return self.body, self.compressed, self.headers
+
+    def __setstate__(self, state):
+        # Entries pickled before headers were added only carry the body and the compressed flag
+        self.body, self.compressed, self.headers = (tuple(state) + (None,))[:3]
+
+
+def encode_items(items):
+    """
+    Serialize a list of model objects (Tweet, User, Hashtag), orjson writes their slots dataclasses natively.
+    A columnar TweetBatch serializes itself.
+    """
+    if hasattr(items, 'to_json'):
+        return items.to_json()
+    return orjson.dumps(items)
+
+
+def json_response(items):
+    return Response(content=encode_items(items), media_type='application/json')
+
+
+def create_cached_response(items, compress=False, compress_min_size=1024, headers=None):
+    """Small bodies are not worth compressing, zlib only pays off on large result lists"""
+    body = encode_items(items)
+    if compress and len(body) >= compress_min_size:
+        return CachedResponse(zlib.compress(body, 1), compressed=True, headers=headers)
+    return CachedResponse(body, headers=headers)
+
+
+def to_response(cached):
+    """Turn a cache hit into a response: raw bytes for cached responses, objects for older entries"""
+    if isinstance(cached, CachedResponse):
+        return Response(content=cached.json_bytes(), media_type='application/json', headers=cached.headers)
+    if hasattr(cached, 'to_json'):
+        return json_response(cached)
+    return cached
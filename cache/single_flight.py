@@ -0,0 +1,98 @@
+import asyncio
+import time
+import uuid
+
+# Deletes the lock only if it is still held by the caller (it may have expired and been taken over)
+RELEASE_LOCK_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent cache misses so that each key is loaded once.
+
+    Within a worker, requests for a key that is already being loaded wait on the same future.
+    Across workers (when a Redis client is given) the loader runs under a short Redis lock;
+    workers that do not get the lock poll the cache until the lock holder has stored the result.
+    """
+
+    def __init__(self, redis_client=None, lock_timeout=10, poll_interval=0.05):
+        self.redis_client = redis_client
+        self.lock_timeout = lock_timeout
+        self.poll_interval = poll_interval
+        self.in_flight = {}
+        self.stats = {'loads': 0, 'coalesced': 0, 'remote_waits': 0}
+        self._release_lock = redis_client.register_script(RELEASE_LOCK_SCRIPT) if redis_client is not None else None
+
+    async def run(self, key, loader, lookup):
+        """
+        Return the result of loader() for the key, running it at most once at a time.
+        lookup() is used to read the result another worker stored in the cache, it returns None on a miss.
+        """
+        future = self.in_flight.get(key)
+        if future is not None:
+            self.stats['coalesced'] += 1
+            return await asyncio.shield(future)
+
+        future = asyncio.get_running_loop().create_future()
+        self.in_flight[key] = future
+        try:
+            result = await self._load(key, loader, lookup)
+            future.set_result(result)
+            return result
+        except BaseException as e:
+            future.set_exception(e)
+            # Mark the exception as retrieved, there may be no waiters to do it
+            future.exception()
+            raise
+        finally:
+            del self.in_flight[key]
+
+    async def _load(self, key, loader, lookup):
+        if self.redis_client is None:
+            self.stats['loads'] += 1
+            return await loader()
+
+        lock_key = f"cache:lock:{key}"
+        token = uuid.uuid4().hex
+        try:
+            acquired = await self.redis_client.set(lock_key, token, nx=True, px=int(self.lock_timeout * 1000))
+        except Exception as e:
+            print(f"Error acquiring cache lock: {e}")
+            acquired = True
+            lock_key = None
+
+        if acquired:
+            try:
+                self.stats['loads'] += 1
+                return await loader()
+            finally:
+                if lock_key is not None:
+                    await self._unlock(lock_key, token)
+
+        # Another worker is loading this key, wait for its result to show up in the cache
+        self.stats['remote_waits'] += 1
+        deadline = time.time() + self.lock_timeout
+        while time.time() < deadline:
+            await asyncio.sleep(self.poll_interval)
+            result = await lookup()
+            if result is not None:
+                return result
+            try:
+                if not await self.redis_client.exists(lock_key):
+                    break
+            except Exception:
+                break
+        # The other worker failed or gave up, load it ourselves
+        self.stats['loads'] += 1
+        return await loader()
+
+    async def _unlock(self, lock_key, token):
+        try:
+            await self._release_lock(keys=[lock_key], args=[token])
+        except Exception as e:
+            print(f"Error releasing cache lock: {e}")
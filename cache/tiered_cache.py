@@ -0,0 +1,162 @@
+import threading
+from typing import Optional, List, Any
+
+from cache.custom_cache import Cache
+from cache.redis_cache import RedisCache
+from cache.key_index import key_namespace, normalize_key
+
+INVALIDATION_CHANNEL = "cache:invalidate"
+
+# Every L1 namespace is matched exactly: L1 memoizes the result of an L2 lookup per query key
+L1_MATCH_MODES = {'hashtag': 'exact', 'id': 'exact', 'trending': 'exact', 'page': 'exact', 'user': 'exact',
+                  'text': 'exact'}
+
+
+class TieredCache:
+    """
+    Two-tier cache with the same interface as custom_cache.py: a small in-process L1
+    in front of the shared RedisCache (L2). Writes are published on a Redis channel
+    so every worker drops the L1 entries they make stale.
+    """
+
+    def __init__(self, max_size=10000, evict_strategy='least_accessed', checkpoint_interval=300, ttl=None,
+                 l1_max_size=256, l1_ttl=30, match_modes=None, redis_client=None, async_redis_client=None):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.l2 = RedisCache(max_size=max_size, evict_strategy=evict_strategy,
+                             checkpoint_interval=checkpoint_interval, ttl=ttl,
+                             match_modes=match_modes, redis_client=redis_client,
+                             async_redis_client=async_redis_client, name='l2')
+        # The short L1 ttl bounds staleness if an invalidation message is ever lost
+        l1_ttl = min(l1_ttl, ttl) if ttl else l1_ttl
+        self.l1 = Cache(max_size=l1_max_size, evict_strategy='least_recent', ttl=l1_ttl,
+                        match_modes=L1_MATCH_MODES, checkpoint_file=None, name='l1')
+        # L1 is touched by request handlers and by the pub/sub thread
+        self.l1_lock = threading.Lock()
+        self.stats = {'l1_hits': 0, 'l2_hits': 0, 'misses': 0, 'invalidations': 0}
+
+        self.pubsub_thread = None
+        if self.l2.redis_client is not None:
+            self._subscribe()
+
+    def _subscribe(self):
+        """Listen for invalidations published by every worker (including this one)"""
+        try:
+            pubsub = self.l2.redis_client.pubsub(ignore_subscribe_messages=True)
+            pubsub.subscribe(**{INVALIDATION_CHANNEL: self._on_invalidation})
+            self.pubsub_thread = pubsub.run_in_thread(sleep_time=1, daemon=True)
+        except Exception as e:
+            print(f"Error subscribing to cache invalidations: {e}")
+
+    def _on_invalidation(self, message):
+        key = message['data']
+        if isinstance(key, bytes):
+            key = key.decode('utf-8')
+        self.invalidate_local(key)
+
+    def _is_stale(self, cached_key: str, written_key: str) -> bool:
+        """Whether an L1 lookup result may change now that written_key was (re)written"""
+        if key_namespace(cached_key) != key_namespace(written_key):
+            return False
+        mode = self.l2.match_modes[key_namespace(written_key)]
+        if mode == 'prefix':
+            return written_key.startswith(cached_key)
+        if mode == 'substring':
+            return cached_key in written_key
+        return cached_key == written_key
+
+    def invalidate_local(self, key: str):
+        """Drop the L1 entries whose lookups match the written key"""
+        key = normalize_key(key)
+        with self.l1_lock:
+            stale_keys = [k for k in self.l1.cache if self._is_stale(k, key)]
+            for k in stale_keys:
+                self.l1.delete(k)
+        self.stats['invalidations'] += len(stale_keys)
+
+    def get(self, key: str) -> Optional[List[Any]]:
+        with self.l1_lock:
+            cached = self.l1.get(key)
+        if cached is not None:
+            self.stats['l1_hits'] += 1
+            return cached[0]
+
+        values = self.l2.get(key)
+        if values is None:
+            self.stats['misses'] += 1
+            return None
+        self.stats['l2_hits'] += 1
+        with self.l1_lock:
+            self.l1.put(key, values)
+        return values
+
+    def put(self, key: str, value: Any):
+        self.l2.put(key, value)
+        self.invalidate_local(key)
+        if self.l2.redis_client is None:
+            return
+        try:
+            self.l2.redis_client.publish(INVALIDATION_CHANNEL, key)
+        except Exception as e:
+            print(f"Error publishing cache invalidation: {e}")
+
+    async def aget(self, key: str) -> Optional[List[Any]]:
+        """Async version of get, L2 lookups go through the asyncio Redis client"""
+        with self.l1_lock:
+            cached = self.l1.get(key)
+        if cached is not None:
+            self.stats['l1_hits'] += 1
+            return cached[0]
+
+        values = await self.l2.aget(key)
+        if values is None:
+            self.stats['misses'] += 1
+            return None
+        self.stats['l2_hits'] += 1
+        with self.l1_lock:
+            self.l1.put(key, values)
+        return values
+
+    async def aput(self, key: str, value: Any):
+        await self.l2.aput(key, value)
+        self.invalidate_local(key)
+        if self.l2.redis_client is None:
+            return
+        try:
+            await self.l2.get_async_client().publish(INVALIDATION_CHANNEL, key)
+        except Exception as e:
+            print(f"Error publishing cache invalidation: {e}")
+
+    def expire_items(self):
+        with self.l1_lock:
+            self.l1.expire_items()
+        self.l2.expire_items()
+
+    async def sweep_expired(self):
+        with self.l1_lock:
+            self.l1.expire_items()
+        await self.l2.sweep_expired()
+
+    def print_cache(self):
+        print('L1 cache:')
+        with self.l1_lock:
+            self.l1.print_cache()
+        print('L2 cache:')
+        self.l2.print_cache()
+
+    def clear_cache(self):
+        with self.l1_lock:
+            for k in list(self.l1.cache):
+                self.l1.delete(k)
+        self.l2.clear_cache()
+
+    def get_cache_stats(self) -> dict:
+        lookups = self.stats['l1_hits'] + self.stats['l2_hits'] + self.stats['misses']
+        return {
+            **self.stats,
+            'l1_hit_ratio': self.stats['l1_hits'] / lookups if lookups else 0.0,
+            'l2_hit_ratio': self.stats['l2_hits'] / lookups if lookups else 0.0,
+            'hit_ratio': (self.stats['l1_hits'] + self.stats['l2_hits']) / lookups if lookups else 0.0,
+            'l1': self.l1.get_cache_stats(),
+            'l2': self.l2.get_cache_stats(),
+        }
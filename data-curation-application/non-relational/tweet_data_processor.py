@@ -0,0 +1,205 @@
+"""
+Load raw tweet files (one Twitter API tweet JSON per line) into the MongoDB tweets collection.
+
+    python tweet_data_processor.py ../data/corona-out-2 ../data/corona-out-3 [--batch-size 1000] [--workers 8] [--follow]
+
+Progress is saved in <file>.tweets.offset after every chunk, a rerun resumes there (--restart
+loads from byte 0). --follow keeps loading the lines appended to the last file, like tail -f.
+
+Same documents as tweet-data-processor.ipynb. The files are parsed on every core by
+database/corpus_reader.py and written in bulk: every batch of lines is one
+unordered bulk_write of upserts keyed by tweet_id. The retweet_count and tweet_score of every source
+tweet retweeted in the batch are then recomputed from the stored retweets (by source_tweet_id), not
+incremented, so a crash between the two writes is repaired when the batch is loaded again, and loading
+a file twice leaves the counts as they were. No separate update pass is needed.
+"""
+import argparse
+import os
+import sys
+import time
+from collections import Counter
+
+from dotenv import load_dotenv
+from pymongo import MongoClient, UpdateOne
+from pymongo.errors import BulkWriteError
+
+# The corpus reader is shared with the user loader and the API's in-memory indexes
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+from database.corpus_reader import read_corpus, follow_corpus, OffsetCheckpoint, LIKE_WEIGHT  # noqa: E402
+
+DUPLICATE_KEY_ERROR = 11000
+RETWEET_WEIGHT = 0.6
+
+
+class Batch:
+    """The tweets and retweeted sources parsed from a batch of lines, deduplicated by tweet_id"""
+
+    def __init__(self):
+        self.tweets = {}
+        self.sources = {}
+        self.line_count = 0
+        self.errors = Counter()
+        # Set on the last batch of a chunk: the file offset that is fully loaded once this batch is written
+        self.end = None
+
+    def __len__(self):
+        return self.line_count
+
+    def add(self, tweet, source):
+        self.line_count += 1
+        if source is not None and source['tweet_id'] not in self.sources:
+            self.sources[source['tweet_id']] = source
+        if tweet['tweet_id'] not in self.tweets:
+            self.tweets[tweet['tweet_id']] = tweet
+
+
+def read_batches(chunks, batch_size):
+    """Batches of at most batch_size tweets from parsed corpus chunks"""
+    for chunk in chunks:
+        batch = Batch()
+        # Lines that could not be parsed are reported with the first batch of their chunk
+        batch.line_count = len(chunk) - len(chunk.tweets)
+        batch.errors.update(chunk.errors)
+        for tweet, source in chunk.tweets:
+            batch.add(tweet, source)
+            if len(batch) >= batch_size:
+                yield batch
+                batch = Batch()
+        batch.end = chunk.end
+        yield batch
+
+
+def bulk_upsert(collection, requests):
+    """Run the upserts unordered, returns the indexes of the requests that inserted a new document"""
+    if not requests:
+        return set()
+    try:
+        result = collection.bulk_write(requests, ordered=False)
+        return set(result.upserted_ids)
+    except BulkWriteError as e:
+        # Another loader inserting the same tweet at the same time loses the race on the unique index,
+        # that tweet is already stored. Anything else is a real failure.
+        failures = [error for error in e.details['writeErrors'] if error['code'] != DUPLICATE_KEY_ERROR]
+        if failures:
+            raise
+        return {upserted['index'] for upserted in e.details['upserted']}
+
+
+def write_batch(collection, batch):
+    """Write one batch, returns (tweets inserted, retweets inserted)"""
+    tweets = list(batch.tweets.values())
+    inserted = bulk_upsert(collection, [
+        UpdateOne({'tweet_id': tweet['tweet_id']}, {'$setOnInsert': tweet}, upsert=True) for tweet in tweets
+    ])
+    retweet_count = sum(1 for index in inserted if tweets[index]['source_tweet_id'])
+
+    # Recount every source retweeted in the batch, including retweets stored by an earlier run that
+    # crashed before counting them. Recounting a source twice sets the same values.
+    source_tweet_ids = {tweet['source_tweet_id'] for tweet in tweets if tweet['source_tweet_id']}
+    if source_tweet_ids:
+        bulk_upsert(collection, [
+            UpdateOne({'tweet_id': source_tweet_id}, {'$setOnInsert': batch.sources[source_tweet_id]}, upsert=True)
+            for source_tweet_id in source_tweet_ids
+        ])
+        counts = collection.aggregate([
+            {'$match': {'source_tweet_id': {'$in': list(source_tweet_ids)}}},
+            {'$group': {'_id': '$source_tweet_id', 'count': {'$sum': 1}}},
+        ])
+        collection.bulk_write([
+            UpdateOne({'tweet_id': count['_id']}, [{'$set': {
+                'retweet_count': count['count'],
+                'tweet_score': {'$add': [RETWEET_WEIGHT * count['count'],
+                                         {'$multiply': [LIKE_WEIGHT, '$likes_count']}]},
+            }}])
+            for count in counts
+        ], ordered=False)
+    return len(inserted), retweet_count
+
+
+def load_tweet_data_to_database(collection, file_path, batch_size=1000, workers=None, checkpoint_path=None,
+                                follow=False, max_delay=1.0):
+    """
+    Load a corpus file, resuming from its offset checkpoint. With follow, keep loading the lines
+    appended to the file afterwards, in micro-batches of up to a chunk or max_delay seconds.
+    """
+    start_time = time.time()
+    line_count = inserted_count = retweet_count = 0
+    errors = Counter()
+    checkpoint = OffsetCheckpoint(file_path, 'tweets', checkpoint_path)
+    start = checkpoint.load()
+    if start:
+        print(f"Resuming {file_path} at byte {start}")
+
+    def chunks():
+        nonlocal start
+        for chunk in read_corpus(file_path, workers, start=start):
+            start = chunk.end
+            yield chunk
+        if follow:
+            print(f"Loaded {file_path} up to byte {start}, following new lines")
+            yield from follow_corpus(file_path, start, max_delay=max_delay)
+
+    for batch in read_batches(chunks(), batch_size):
+        inserted, retweets = write_batch(collection, batch)
+        if batch.end is not None:
+            checkpoint.save(batch.end)
+        line_count += len(batch)
+        inserted_count += inserted
+        retweet_count += retweets
+        errors.update(batch.errors)
+        if not len(batch):
+            continue
+        elapsed = time.time() - start_time
+        print(f"{file_path}: {line_count} lines, inserted {inserted_count} tweets ({retweet_count} retweets) "
+              f"({line_count / elapsed:.0f} tweets/sec)")
+
+    elapsed = time.time() - start_time
+    print(f"Loaded {file_path}: {line_count} lines in {elapsed:.2f} seconds ({line_count / max(elapsed, 1e-9):.0f} tweets/sec)")
+    for error, count in errors.most_common(10):
+        print(f"Skipped {count} lines: {error}")
+    return line_count
+
+
+def main():
+    load_dotenv()
+    parser = argparse.ArgumentParser(description="Load raw tweet files into the MongoDB tweets collection")
+    parser.add_argument('files', nargs='+', help="Files with one tweet JSON per line")
+    parser.add_argument('--batch-size', type=int, default=1000)
+    parser.add_argument('--workers', type=int, default=None, help="Parsing processes, one per core by default")
+    parser.add_argument('--follow', action='store_true', help="Keep loading lines appended to the last file")
+    parser.add_argument('--max-delay', type=float, default=1.0,
+                        help="With --follow, longest a new line waits before its micro-batch is written (seconds)")
+    parser.add_argument('--restart', action='store_true', help="Ignore the offset checkpoints and load from byte 0")
+    parser.add_argument('--mongodb-uri', default=os.getenv('MONGODB_URI'))
+    parser.add_argument('--database', default="twitter-database")
+    parser.add_argument('--collection', default="tweets")
+    args = parser.parse_args()
+    if not args.mongodb_uri:
+        parser.error("MONGODB_URI must be set or --mongodb-uri given")
+
+    client = MongoClient(args.mongodb_uri)
+    collection = client[args.database][args.collection]
+    # Upserts are keyed by tweet_id, the unique index makes them idempotent under concurrent loaders
+    collection.create_index([('tweet_id', 1)], unique=True, name='tweet_id')
+    # Retweets are recounted per batch by their source
+    collection.create_index([('source_tweet_id', 1)], name='source_tweet_id')
+
+    start_time = time.time()
+    line_count = 0
+    try:
+        for index, file_path in enumerate(args.files):
+            if args.restart:
+                OffsetCheckpoint(file_path, 'tweets').save(0)
+            follow = args.follow and index == len(args.files) - 1
+            line_count += load_tweet_data_to_database(collection, file_path, args.batch_size, args.workers,
+                                                      follow=follow, max_delay=args.max_delay)
+    except KeyboardInterrupt:
+        print("Stopped, the next run resumes from the offset checkpoints")
+    elapsed = time.time() - start_time
+    print(f"Loaded {line_count} lines in {elapsed:.2f} seconds ({line_count / max(elapsed, 1e-9):.0f} tweets/sec), "
+          f"{collection.count_documents({})} tweets in the collection")
+    client.close()
+
+
+if __name__ == "__main__":
+    main()
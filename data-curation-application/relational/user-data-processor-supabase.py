@@ -1,10 +1,17 @@
+import argparse
 import json
+import sys
 import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from supabase import create_client, Client
 import os
 from dotenv import load_dotenv
 
+# The corpus reader is shared with the tweet loader and the API's in-memory indexes
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+from database.corpus_reader import read_corpus, follow_corpus, OffsetCheckpoint
+
 # Load environment variables
 load_dotenv()
 
@@ -179,6 +186,80 @@ def load_user_data_to_supabase(supabase, file_path):
     except Exception as e:
         print(f"Error loading user data: {e}")
 
+def latest_users(corpus_chunk):
+    """The users of a parsed corpus chunk, keeping the latest snapshot per user id (the corpus is in stream order)"""
+    users = {}
+    for user in corpus_chunk.users:
+        users[user['user_id']] = user
+    return list(users.values())
+
+def upsert_users(supabase, users, max_retries=3):
+    """Insert or update one chunk of users, retrying with exponential backoff"""
+    for attempt in range(max_retries + 1):
+        try:
+            supabase.table('users').upsert(users, on_conflict='user_id').execute()
+            return True
+        except Exception as e:
+            if attempt == max_retries:
+                print(f"Error upserting {len(users)} users: {e}")
+                return False
+            time.sleep(2 ** attempt)
+
+def load_user_data_to_supabase_batched(supabase, file_path, chunk_size=500, concurrency=4, max_retries=3,
+                                       workers=None, follow=False, max_delay=1.0):
+    """
+    Load user data with one upsert per chunk of users instead of a SELECT and an INSERT per line.
+    Users seen again are updated, so changed follower and tweet counts are written too.
+    The file offset is checkpointed after every corpus chunk, a rerun resumes there. With follow,
+    users of lines appended to the file are loaded as they arrive.
+    """
+    start_time = time.time()
+    processed_count = 0
+    upserted_count = 0
+    checkpoint = OffsetCheckpoint(file_path, 'users')
+    start = checkpoint.load()
+    if start:
+        print(f"Resuming {file_path} at byte {start}")
+
+    def corpus_chunks():
+        nonlocal start
+        for corpus_chunk in read_corpus(file_path, workers, start=start):
+            start = corpus_chunk.end
+            yield corpus_chunk
+        if follow:
+            print(f"Loaded {file_path} up to byte {start}, following new lines")
+            yield from follow_corpus(file_path, start, max_delay=max_delay)
+
+    try:
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            for corpus_chunk in corpus_chunks():
+                for error, count in corpus_chunk.errors.items():
+                    if error.startswith('user'):
+                        print(f"Error processing {count} lines: {error}")
+                rows = latest_users(corpus_chunk)
+                chunks = [rows[i:i + chunk_size] for i in range(0, len(rows), chunk_size)]
+                results = list(executor.map(lambda chunk: upsert_users(supabase, chunk, max_retries), chunks))
+                upserted_count += sum(len(chunk) for chunk, upserted in zip(chunks, results) if upserted)
+                if not all(results):
+                    print(f"Stopping at byte {corpus_chunk.start} of {file_path}, rerun to resume from there")
+                    break
+                # Only move the checkpoint once every user before it is stored
+                checkpoint.save(corpus_chunk.end)
+                processed_count += len(corpus_chunk.users)
+                print(f"Processed {processed_count} users, upserted {upserted_count} "
+                      f"({processed_count / max(time.time() - start_time, 1e-9):.0f} users/sec)")
+
+        total_time = time.time() - start_time
+        print(f"Successfully processed {processed_count} users")
+        print(f"Upserted {upserted_count} users")
+        print(f"Total time: {total_time:.2f} seconds")
+        print(f"Total users in database: {get_users_count(supabase)}")
+
+    except KeyboardInterrupt:
+        print(f"Stopped, the next run resumes {file_path} from the offset checkpoint")
+    except Exception as e:
+        print(f"Error loading user data: {e}")
+
 def create_indexes(supabase):
     """Create indexes for better query performance"""
     try:
@@ -199,6 +280,20 @@ def create_indexes(supabase):
 
 def main():
     """Main function to run the user data processing"""
+    parser = argparse.ArgumentParser(description="Load the users of a tweet corpus into Supabase")
+    # Update this path to your user data file
+    parser.add_argument('file_path', nargs='?', default="../data/corona-out-3")
+    parser.add_argument('--per-line', action='store_true', help="Check and insert users one line at a time")
+    parser.add_argument('--chunk-size', type=int, default=500, help="Users per upsert request")
+    parser.add_argument('--concurrency', type=int, default=4, help="Upsert requests in flight")
+    parser.add_argument('--max-retries', type=int, default=3)
+    parser.add_argument('--workers', type=int, default=None, help="Corpus parsing processes, one per core by default")
+    parser.add_argument('--follow', action='store_true', help="Keep loading the users of lines appended to the file")
+    parser.add_argument('--max-delay', type=float, default=1.0,
+                        help="With --follow, longest a new line waits before its micro-batch is written (seconds)")
+    parser.add_argument('--restart', action='store_true', help="Ignore the offset checkpoint and load from byte 0")
+    args = parser.parse_args()
+
     print("Starting user data processing for Supabase...")
     
     # Connect to Supabase
@@ -213,11 +308,16 @@ def main():
     #     return
     
     # Load user data from file
-    # Update this path to your user data file
-    file_path = "../data/corona-out-3"  # Update this path
+    file_path = args.file_path
     
     if os.path.exists(file_path):
-        load_user_data_to_supabase(supabase, file_path)
+        if args.per_line:
+            load_user_data_to_supabase(supabase, file_path)
+        else:
+            if args.restart:
+                OffsetCheckpoint(file_path, 'users').save(0)
+            load_user_data_to_supabase_batched(supabase, file_path, args.chunk_size, args.concurrency,
+                                               args.max_retries, args.workers, args.follow, args.max_delay)
         
         # Create indexes for better performance
         # create_indexes(supabase)
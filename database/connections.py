@@ -0,0 +1,40 @@
+import asyncio
+import os
+from pymongo import AsyncMongoClient
+from supabase import acreate_client, AsyncClient
+
+
+def connect_to_mongodb():
+    """Create the async MongoDB client, its pool size bounds the number of concurrent queries"""
+    try:
+        mongodb_uri = os.getenv('MONGODB_URI')
+        if not mongodb_uri:
+            raise ValueError("MONGODB_URI must be set")
+
+        mongo_client = AsyncMongoClient(mongodb_uri, maxPoolSize=int(os.getenv('MONGODB_MAX_POOL_SIZE', '100')))
+        print("Connected to MongoDB database")
+        return mongo_client
+    except Exception as e:
+        print(f"Error occurred while connecting to MongoDB: {e}")
+        return None
+
+
+async def connect_to_supabase():
+    """Connect to Supabase database with the async (httpx based) client"""
+    try:
+        supabase_url = os.getenv('SUPABASE_URL')
+        supabase_key = os.getenv('SUPABASE_ANON_KEY')
+        if not supabase_url or not supabase_key:
+            raise ValueError("SUPABASE_URL and SUPABASE_ANON_KEY must be set")
+
+        supabase: AsyncClient = await acreate_client(supabase_url, supabase_key)
+        print("Connected to Supabase database")
+        return supabase
+    except Exception as e:
+        print(f"Error occurred while connecting to Supabase: {e}")
+        return None
+
+
+# Bounds the number of Supabase requests in flight per worker, so a burst of searches
+# queues up here instead of opening an unbounded number of HTTP connections
+supabase_limiter = asyncio.Semaphore(int(os.getenv('SUPABASE_MAX_CONCURRENCY', '20')))
@@ -0,0 +1,234 @@
+"""
+Parallel reader for the raw tweet corpus (one Twitter API tweet JSON per line, e.g. corona-out-2).
+
+The file is split into byte ranges that end on a newline, each range is memory-mapped and parsed
+in a worker process with orjson, and the normalized records come back in file order:
+
+    for chunk in read_corpus(file_path, workers=8):
+        chunk.tweets   # (tweet, retweeted source or None) pairs, tweets collection documents
+        chunk.users    # users table rows, one per line with a user
+
+Records have the fields the tweet and user data processors store, with retweet_count 0 and
+tweet_score computed from the likes. Counting retweets is left to the sink.
+
+Each chunk knows the byte range it came from. Loaders save chunk.end in an OffsetCheckpoint once
+a chunk is written, pass it back as start to resume, and follow_corpus keeps reading the lines
+appended to the file after that.
+"""
+import mmap
+import os
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+
+import orjson
+
+DEFAULT_CHUNK_SIZE = 16 * 1024 * 1024
+LIKE_WEIGHT = 0.4
+MONTHS = {month: index for index, month in enumerate(
+    ['Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun', 'Jul', 'Aug', 'Sep', 'Oct', 'Nov', 'Dec'], 1)}
+
+
+def twitter_date(created_at):
+    """'Wed Apr 01 10:00:00 +0000 2020' as '2020-04-01 10:00:00'. The API always sends UTC, strptime is the fallback"""
+    parts = created_at.split(' ')
+    if len(parts) == 6 and parts[4] == '+0000' and parts[1] in MONTHS:
+        return f"{parts[5]}-{MONTHS[parts[1]]:02d}-{int(parts[2]):02d} {parts[3]}"
+    return datetime.strptime(created_at, "%a %b %d %H:%M:%S %z %Y").strftime("%Y-%m-%d %H:%M:%S")
+
+
+def tweet_record(tweet, source_tweet_id=0):
+    return {
+        'tweet_id': tweet['id_str'],
+        'text': tweet['text'],
+        'hashtag': [hashtag["text"] for hashtag in tweet['entities']['hashtags']],
+        'user_id': tweet['user']['id_str'],
+        'user_name': tweet['user']['name'],
+        'user_screen_name': tweet['user']['screen_name'],
+        'likes_count': tweet['favorite_count'],
+        'retweet_count': 0,
+        'source_tweet_id': source_tweet_id,
+        'tweet_score': LIKE_WEIGHT * tweet['favorite_count'],
+        'created_at': twitter_date(tweet['created_at']),
+    }
+
+
+def user_record(user_data):
+    return {
+        'user_id': user_data['id_str'],
+        'name': user_data['name'],
+        'screen_name': user_data['screen_name'],
+        'followers_count': user_data['followers_count'],
+        'friends_count': user_data['friends_count'],
+        'tweets_count': user_data['statuses_count'],
+        'verified': user_data['verified'],
+        'created_at': twitter_date(user_data['created_at']),
+        'description': user_data.get('description', ''),
+        'location': user_data.get('location', ''),
+        'profile_image_url': user_data.get('profile_image_url', ''),
+    }
+
+
+class Chunk:
+    """The records parsed from one byte range of the corpus"""
+
+    def __init__(self, start=0, end=0):
+        self.start = start
+        self.end = end
+        self.tweets = []
+        self.users = []
+        self.line_count = 0
+        self.errors = Counter()
+
+    def __len__(self):
+        return self.line_count
+
+    def add_line(self, line):
+        self.line_count += 1
+        try:
+            data = orjson.loads(line)
+        except orjson.JSONDecodeError:
+            self.errors['invalid json'] += 1
+            return
+        # The user and the tweet of a line are independent, a line may be usable for one sink only
+        try:
+            if data.get('user'):
+                self.users.append(user_record(data['user']))
+        except (KeyError, TypeError, ValueError) as e:
+            self.errors[f"user {type(e).__name__}: {e}"] += 1
+        try:
+            source = None
+            if data['text'].startswith('RT') and data.get('retweeted_status'):
+                source = tweet_record(data['retweeted_status'])
+            self.tweets.append((tweet_record(data, source['tweet_id'] if source else 0), source))
+        except (KeyError, TypeError, ValueError) as e:
+            self.errors[f"tweet {type(e).__name__}: {e}"] += 1
+
+
+def chunk_ranges(file_path, chunk_size=DEFAULT_CHUNK_SIZE, start=0):
+    """(start, end) byte ranges covering the file from start, each ending just after a newline (or at the end of the file)"""
+    size = os.path.getsize(file_path)
+    ranges = []
+    with open(file_path, 'rb') as read_file:
+        while start < size:
+            end = min(start + chunk_size, size)
+            if end < size:
+                read_file.seek(end)
+                end += len(read_file.readline())
+            ranges.append((start, end))
+            start = end
+    return ranges
+
+
+def parse_range(file_path, start, end):
+    """Parse the lines of one byte range, memory-mapped when the file allows it"""
+    chunk = Chunk(start, end)
+    with open(file_path, 'rb') as read_file:
+        try:
+            with mmap.mmap(read_file.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                data = mapped[start:end]
+        except (ValueError, OSError):
+            read_file.seek(start)
+            data = read_file.read(end - start)
+    for line in data.splitlines():
+        if line.strip():
+            chunk.add_line(line)
+    return chunk
+
+
+def _parse_range(job):
+    return parse_range(*job)
+
+
+def read_corpus(file_path, workers=None, chunk_size=DEFAULT_CHUNK_SIZE, start=0):
+    """
+    Parsed chunks of the file from byte offset start, in file order. workers=1 parses in this
+    process, otherwise a pool of workers (one per core by default) parses ahead of the consumer.
+    """
+    ranges = chunk_ranges(file_path, chunk_size, start)
+    if workers == 1 or len(ranges) <= 1:
+        for range_start, range_end in ranges:
+            yield parse_range(file_path, range_start, range_end)
+        return
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        jobs = [(file_path, range_start, range_end) for range_start, range_end in ranges]
+        # Bounded read-ahead, so a slow sink does not pile up the whole parsed corpus in memory
+        ahead = 2 * (workers or os.cpu_count() or 1)
+        pending = [executor.submit(_parse_range, job) for job in jobs[:ahead]]
+        for index in range(len(jobs)):
+            if index + ahead < len(jobs):
+                pending.append(executor.submit(_parse_range, jobs[index + ahead]))
+            yield pending[index].result()
+            pending[index] = None
+
+
+def complete_lines_end(file_path, start, size, chunk_size):
+    """End of the last complete line in the chunk_size bytes after start, start if there is none yet"""
+    with open(file_path, 'rb') as read_file:
+        read_file.seek(start)
+        data = read_file.read(min(chunk_size, size - start))
+        newline = data.rfind(b'\n')
+        if newline >= 0:
+            return start + newline + 1
+        if len(data) == chunk_size:
+            # A single line longer than a chunk
+            line = read_file.readline()
+            if line.endswith(b'\n'):
+                return start + len(data) + len(line)
+    return start
+
+
+def follow_corpus(file_path, start=0, chunk_size=DEFAULT_CHUNK_SIZE, max_delay=1.0, poll_interval=0.2):
+    """
+    Parsed chunks of the lines appended to the file after byte offset start, forever (like tail -f).
+    New lines are micro-batched: a chunk is parsed once chunk_size bytes are waiting or the oldest
+    waiting line has waited max_delay seconds. A line still being written is left for the next chunk.
+    """
+    waiting_since = None
+    while True:
+        size = os.path.getsize(file_path)
+        if size < start:
+            print(f"{file_path} was truncated, following it from the start")
+            start, waiting_since = 0, None
+        if size > start:
+            now = time.time()
+            waiting_since = waiting_since or now
+            if size - start >= chunk_size or now - waiting_since >= max_delay:
+                end = complete_lines_end(file_path, start, size, chunk_size)
+                if end > start:
+                    yield parse_range(file_path, start, end)
+                    start, waiting_since = end, None
+                    continue
+        time.sleep(poll_interval)
+
+
+class OffsetCheckpoint:
+    """
+    The byte offset up to which a loader has written a corpus file, saved atomically next to it
+    (or at path), so an interrupted run resumes where it stopped instead of at byte 0.
+    """
+
+    def __init__(self, file_path, name, path=None):
+        self.file_path = file_path
+        self.path = path or f"{file_path}.{name}.offset"
+
+    def load(self):
+        try:
+            with open(self.path, 'rb') as checkpoint_file:
+                offset = orjson.loads(checkpoint_file.read())['offset']
+        except FileNotFoundError:
+            return 0
+        if offset > os.path.getsize(self.file_path):
+            print(f"{self.path} points past the end of {self.file_path}, starting from the beginning")
+            return 0
+        return offset
+
+    def save(self, offset):
+        temp_path = self.path + '.tmp'
+        with open(temp_path, 'wb') as checkpoint_file:
+            checkpoint_file.write(orjson.dumps({'offset': offset}))
+            checkpoint_file.flush()
+            os.fsync(checkpoint_file.fileno())
+        os.replace(temp_path, self.path)
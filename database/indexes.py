@@ -0,0 +1,102 @@
+"""
+Indexes for the tweets collection and a query plan check for every endpoint query.
+
+    python -m database.indexes            create the indexes, then check the query plans
+    python -m database.indexes --check    only check the query plans
+
+The check runs explain() on the exact queries the endpoints send and fails if any of
+them scans the collection. The /hashtags aggregation is not checked: counting every
+hashtag has to read every document.
+"""
+import os
+import sys
+
+import pymongo
+from dotenv import load_dotenv
+
+from database import tweets as tweet_queries
+from database.pagination import decode_cursor, encode_cursor
+
+# One index per access pattern. The sort fields follow the filter fields so results come out of
+# the index already ordered and limit(n) stops after n documents. Queries cannot be fully covered
+# because the projected hashtag field is an array (multikey indexes never cover) and text is too
+# large to index, so each returned document is still fetched, but only the ones returned.
+TWEET_INDEXES = [
+    ([("hashtag", pymongo.ASCENDING), ("tweet_score", pymongo.DESCENDING)], "hashtag_score"),
+    ([("user_screen_name", pymongo.ASCENDING), ("tweet_score", pymongo.DESCENDING), ("_id", pymongo.DESCENDING)],
+     "screen_name_score"),
+    ([("created_at", pymongo.DESCENDING)], "created_at"),
+    ([("tweet_score", pymongo.DESCENDING), ("_id", pymongo.DESCENDING)], "score"),
+    ([("text", pymongo.TEXT)], "text"),
+]
+
+
+def ensure_tweet_indexes(tweets_collection):
+    existing_keys = [tuple(info['key']) for info in tweets_collection.index_information().values()]
+    for keys, name in TWEET_INDEXES:
+        # A collection has at most one text index and it is stored under internal _fts keys
+        is_text = keys[0][1] == pymongo.TEXT
+        if tuple(keys) in existing_keys or (is_text and any(key[0][0] == '_fts' for key in existing_keys)):
+            continue
+        tweets_collection.create_index(keys, name=name)
+        print(f"Created index {name}")
+
+
+def plan_stages(plan):
+    """All stage names of an explain() plan tree"""
+    stages = [plan.get('stage')]
+    for child_key in ('inputStage', 'queryPlan'):
+        if child_key in plan:
+            stages.extend(plan_stages(plan[child_key]))
+    for child in plan.get('inputStages', []):
+        stages.extend(plan_stages(child))
+    return stages
+
+
+def endpoint_queries(tweets_collection):
+    """The find() arguments of every endpoint query, built from a sample document"""
+    sample = tweets_collection.find_one({"hashtag.0": {"$exists": True}}) or tweets_collection.find_one()
+    if sample is None:
+        raise ValueError("The tweets collection is empty, there is nothing to explain")
+    after = decode_cursor(encode_cursor(sample))
+    word = sample["text"].split()[0] if sample["text"].split() else "corona"
+    hashtag = sample["hashtag"][0] if sample.get("hashtag") else "corona"
+    return {
+        "/recenttweets": tweet_queries.recent_tweets_query(),
+        "/trendingtweets": tweet_queries.trending_tweets_query(),
+        "/filterby hashtag": tweet_queries.tweets_by_hashtag_query(hashtag),
+        "/gettweetsbyuserid": tweet_queries.tweets_by_screen_name_query(sample["user_screen_name"]),
+        "/gettweetsbyuserid next page": tweet_queries.tweets_by_screen_name_query(
+            sample["user_screen_name"], after=after),
+        "/filterby text": tweet_queries.search_tweets_query(word),
+        "/filterby text next page": tweet_queries.search_tweets_query(word, after=after),
+    }
+
+
+def check_query_plans(tweets_collection):
+    """Print the winning plan of every endpoint query, returns False if any of them scans the collection"""
+    all_indexed = True
+    for endpoint, query in endpoint_queries(tweets_collection).items():
+        explain = tweets_collection.find(**query).explain()
+        stages = plan_stages(explain['queryPlanner']['winningPlan'])
+        uses_index = any(stage in ('IXSCAN', 'TEXT', 'TEXT_OR', 'TEXT_MATCH', 'COUNT_SCAN') for stage in stages)
+        ok = uses_index and 'COLLSCAN' not in stages
+        all_indexed = all_indexed and ok
+        print(f"{'ok  ' if ok else 'FAIL'} {endpoint:<30} {' <- '.join(stage for stage in stages if stage)}")
+    return all_indexed
+
+
+def main():
+    load_dotenv()
+    client = pymongo.MongoClient(os.getenv('MONGODB_URI'))
+    tweets_collection = client["twitter-database"]["tweets"]
+    if '--check' not in sys.argv:
+        ensure_tweet_indexes(tweets_collection)
+    if not check_query_plans(tweets_collection):
+        print("Some endpoint queries scan the whole collection")
+        sys.exit(1)
+    print("Every endpoint query uses an index")
+
+
+if __name__ == "__main__":
+    main()
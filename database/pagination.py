@@ -0,0 +1,60 @@
+import base64
+import json
+
+from bson import ObjectId
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+# Tweets are paged in (tweet_score, _id) descending order; _id breaks ties between equal scores
+KEYSET_SORT = [("tweet_score", -1), ("_id", -1)]
+
+
+def encode_cursor(tweet):
+    """Opaque cursor pointing just after the given tweet"""
+    position = json.dumps([tweet["tweet_score"], str(tweet["_id"])])
+    return base64.urlsafe_b64encode(position.encode('utf-8')).decode('ascii')
+
+
+def decode_cursor(cursor):
+    """Return the (tweet_score, _id) a cursor points after, or None for the first page"""
+    if not cursor:
+        return None
+    try:
+        tweet_score, tweet_id = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+        return float(tweet_score), ObjectId(tweet_id)
+    except Exception:
+        raise ValueError(f"Invalid cursor: {cursor}")
+
+
+def keyset_filter(query, after):
+    """Restrict a query to the tweets that sort after the cursor position"""
+    if after is None:
+        return query
+    tweet_score, tweet_id = after
+    return {
+        **query,
+        "$or": [
+            {"tweet_score": {"$lt": tweet_score}},
+            {"tweet_score": tweet_score, "_id": {"$lt": tweet_id}},
+        ]
+    }
+
+
+def clamp_page_size(limit):
+    return max(1, min(limit, MAX_PAGE_SIZE))
+
+
+def page_query(query, limit, after, projection=None):
+    """find() arguments for one page; one extra tweet is fetched to know whether a next page exists"""
+    return {"filter": keyset_filter(query, after), "projection": projection, "sort": KEYSET_SORT,
+            "limit": limit + 1}
+
+
+async def fetch_page(collection, query, limit):
+    """Run a page_query, returns the tweets and the cursor of the next page (None on the last page)"""
+    tweets = await collection.find(**query).to_list()
+    if len(tweets) <= limit:
+        return tweets, None
+    tweets = tweets[:limit]
+    return tweets, encode_cursor(tweets[-1])
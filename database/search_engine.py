@@ -0,0 +1,351 @@
+"""
+In-process full-text search over tweet text and hashtags, an alternative to Mongo's $text index.
+
+The main segment is built once from all tweets. Documents are numbered in (tweet_score, tweet_id)
+descending order, so every posting list is already in score order and a top-k scan can stop as
+soon as it has k matches (or, with BM25 ranking, as soon as no later document can beat the k-th
+best). Postings are delta + varint encoded. Tweets added afterwards go to a small uncompressed
+delta segment that is merged into the main one by compact().
+
+Query syntax, close to $text: words match any of them, "quoted phrases" must all appear,
+cov* matches words by prefix and -word excludes tweets containing it.
+"""
+import base64
+import heapq
+import json
+import math
+import re
+from bisect import bisect_left, insort
+from collections import Counter, defaultdict
+
+from database.corpus_reader import read_corpus
+from database.tweets import TWEET_FIELDS
+from monitoring.metrics import timed_query
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9_]+")
+QUERY_PATTERN = re.compile(r'"([^"]*)"|(\S+)')
+STOP_WORDS = frozenset(['a', 'an', 'and', 'are', 'as', 'at', 'be', 'by', 'for', 'from', 'has', 'in', 'is', 'it',
+                        'its', 'of', 'on', 'or', 'that', 'the', 'this', 'to', 'was', 'were', 'will', 'with',
+                        'rt', 'https', 'http', 'co'])
+
+# Everything create_tweet_object needs plus the ranking and key fields
+ENGINE_PROJECTION = {"_id": 0, "tweet_id": 1, "tweet_score": 1, **{field: 1 for field in TWEET_FIELDS}}
+
+RANKINGS = ('score', 'bm25')
+
+
+def tokenize(text):
+    return [token for token in TOKEN_PATTERN.findall(text.lower()) if token not in STOP_WORDS]
+
+
+def write_varint(out, value):
+    while value >= 0x80:
+        out.append((value & 0x7F) | 0x80)
+        value >>= 7
+    out.append(value)
+
+
+def encode_postings(postings):
+    """(doc_id, term frequency) pairs in doc id order, as varint doc id gaps interleaved with frequencies"""
+    out = bytearray()
+    previous = 0
+    for doc_id, tf in postings:
+        write_varint(out, doc_id - previous)
+        write_varint(out, tf)
+        previous = doc_id
+    return bytes(out)
+
+
+def decode_postings(data):
+    """Lazily decode a posting list, so a scan that stops early never decodes the rest"""
+    doc_id = 0
+    value = shift = 0
+    is_doc_id = True
+    for byte in data:
+        value |= (byte & 0x7F) << shift
+        if byte & 0x80:
+            shift += 7
+            continue
+        if is_doc_id:
+            doc_id += value
+        else:
+            yield doc_id, value
+        is_doc_id = not is_doc_id
+        value = shift = 0
+
+
+def tagged_postings(data, term):
+    """(doc_id, tf, term) for a term's posting list, the term is bound here so every stream keeps its own"""
+    for doc_id, tf in decode_postings(data):
+        yield doc_id, tf, term
+
+
+# Engine cursors are tagged, so a Mongo keyset cursor ([tweet_score, _id]) is rejected here
+# instead of being misread as a rank, and the Mongo side rejects engine cursors the same way
+CURSOR_TAG = 'engine'
+
+
+def encode_cursor(rank, tweet_id):
+    """Cursor pointing just after a result, as (ranking value, tweet_id)"""
+    return base64.urlsafe_b64encode(json.dumps([CURSOR_TAG, rank, tweet_id]).encode('utf-8')).decode('ascii')
+
+
+def decode_cursor(cursor):
+    if not cursor:
+        return None
+    try:
+        tag, rank, tweet_id = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+        if tag != CURSOR_TAG:
+            raise ValueError(tag)
+        return float(rank), str(tweet_id)
+    except Exception:
+        raise ValueError(f"Invalid cursor: {cursor}")
+
+
+class Query:
+    def __init__(self, text):
+        self.terms = set()
+        self.prefixes = set()
+        self.phrases = []
+        self.excluded = set()
+        for phrase, word in QUERY_PATTERN.findall(text):
+            if phrase:
+                tokens = tokenize(phrase)
+                if len(tokens) > 1:
+                    self.phrases.append(tokens)
+                self.terms.update(tokens)
+            elif word.startswith('-'):
+                self.excluded.update(tokenize(word[1:]))
+            elif word.endswith('*'):
+                tokens = tokenize(word[:-1])
+                self.terms.update(tokens[:-1])
+                self.prefixes.update(tokens[-1:])
+            else:
+                self.terms.update(tokenize(word))
+
+
+def contains_phrase(tokens, phrase):
+    size = len(phrase)
+    return any(tokens[i:i + size] == phrase for i in range(len(tokens) - size + 1))
+
+
+class SearchEngine:
+    def __init__(self, ranking='score', score_weight=1.0, k1=1.2, b=0.75, compact_after=10000):
+        if ranking not in RANKINGS:
+            raise ValueError(f"Unknown ranking: {ranking}, expected one of {', '.join(RANKINGS)}")
+        self.ranking = ranking
+        self.score_weight = score_weight
+        self.k1 = k1
+        self.b = b
+        self.compact_after = compact_after
+        self.ready = False
+        self.build([])
+
+    def build(self, documents):
+        """Index all documents as the main segment, replacing whatever was indexed before"""
+        documents = sorted(documents, key=lambda doc: (doc["tweet_score"], doc["tweet_id"]), reverse=True)
+        self.docs = []
+        self.doc_lengths = []
+        self.doc_ids = {}
+        self.deleted = set()
+        term_postings = defaultdict(list)
+        for doc in documents:
+            if doc["tweet_id"] in self.doc_ids:
+                continue
+            doc_id = len(self.docs)
+            counts = Counter(self._doc_tokens(doc))
+            self.docs.append(doc)
+            self.doc_lengths.append(sum(counts.values()))
+            self.doc_ids[doc["tweet_id"]] = doc_id
+            for term, tf in counts.items():
+                term_postings[term].append((doc_id, tf))
+
+        self.main_size = len(self.docs)
+        self.average_length = sum(self.doc_lengths) / self.main_size if self.main_size else 1.0
+        self.max_score = max((doc["tweet_score"] for doc in self.docs), default=0)
+        self.postings = {}
+        self.document_frequency = Counter()
+        self.max_tf_factor = {}
+        for term, postings in term_postings.items():
+            self.postings[term] = encode_postings(postings)
+            self.document_frequency[term] = len(postings)
+            self.max_tf_factor[term] = max(self._tf_factor(tf, self.doc_lengths[doc_id]) for doc_id, tf in postings)
+        self.vocabulary = sorted(self.postings)
+        self.delta_postings = defaultdict(list)
+
+    def add(self, doc):
+        """Index one new (or updated) tweet in the delta segment"""
+        old_doc_id = self.doc_ids.get(doc["tweet_id"])
+        if old_doc_id is not None:
+            self._remove(old_doc_id)
+
+        doc_id = len(self.docs)
+        counts = Counter(self._doc_tokens(doc))
+        self.docs.append(doc)
+        self.doc_lengths.append(sum(counts.values()))
+        self.doc_ids[doc["tweet_id"]] = doc_id
+        for term, tf in counts.items():
+            if term not in self.postings and term not in self.delta_postings:
+                insort(self.vocabulary, term)
+            self.delta_postings[term].append((doc_id, tf))
+            self.document_frequency[term] += 1
+
+        if len(self.docs) - self.main_size >= self.compact_after:
+            self.compact()
+
+    def compact(self):
+        """Rebuild the main segment from every live document, merging in the delta segment"""
+        self.build([doc for doc_id, doc in enumerate(self.docs) if doc_id not in self.deleted])
+
+    def _remove(self, doc_id):
+        self.deleted.add(doc_id)
+        for term in set(self._doc_tokens(self.docs[doc_id])):
+            self.document_frequency[term] -= 1
+
+    @staticmethod
+    def _doc_tokens(doc):
+        tokens = tokenize(doc.get("text") or "")
+        for hashtag in doc.get("hashtag") or []:
+            tokens.extend(tokenize(hashtag))
+        return tokens
+
+    def _tf_factor(self, tf, doc_length):
+        return tf * (self.k1 + 1) / (tf + self.k1 * (1 - self.b + self.b * doc_length / self.average_length))
+
+    def _idf(self, term):
+        live_count = len(self.docs) - len(self.deleted)
+        df = self.document_frequency[term]
+        return math.log(1 + (live_count - df + 0.5) / (df + 0.5))
+
+    def _normalized_score(self, score):
+        if self.max_score <= 0:
+            return 0.0
+        return math.log1p(max(score, 0)) / math.log1p(self.max_score)
+
+    def _query_terms(self, query):
+        terms = set(query.terms)
+        for prefix in query.prefixes:
+            start = bisect_left(self.vocabulary, prefix)
+            for term in self.vocabulary[start:]:
+                if not term.startswith(prefix):
+                    break
+                terms.add(term)
+        return terms
+
+    def _main_matches(self, terms):
+        """(doc_id, {term: tf}) for every main segment document containing any of the terms, in doc id order"""
+        streams = [tagged_postings(self.postings[term], term) for term in terms if term in self.postings]
+        current_id, tfs = None, {}
+        for doc_id, tf, term in heapq.merge(*streams):
+            if doc_id != current_id:
+                if current_id is not None:
+                    yield current_id, tfs
+                current_id, tfs = doc_id, {}
+            tfs[term] = tf
+        if current_id is not None:
+            yield current_id, tfs
+
+    def _delta_matches(self, terms):
+        matches = defaultdict(dict)
+        for term in terms:
+            for doc_id, tf in self.delta_postings.get(term, ()):
+                matches[doc_id][term] = tf
+        return matches.items()
+
+    def _accepts(self, doc_id, query):
+        if doc_id in self.deleted:
+            return False
+        if not query.phrases and not query.excluded:
+            return True
+        if query.excluded and query.excluded.intersection(self._doc_tokens(self.docs[doc_id])):
+            return False
+        tokens = tokenize(self.docs[doc_id].get("text") or "")
+        return all(contains_phrase(tokens, phrase) for phrase in query.phrases)
+
+    def _rank(self, doc_id, tfs, idfs):
+        doc = self.docs[doc_id]
+        if self.ranking == 'score':
+            return doc["tweet_score"]
+        doc_length = self.doc_lengths[doc_id]
+        bm25 = sum(idfs[term] * self._tf_factor(tf, doc_length) for term, tf in tfs.items())
+        return bm25 + self.score_weight * self._normalized_score(doc["tweet_score"])
+
+    def search(self, text, limit=10, after=None):
+        """
+        One page of matching tweets, best first. Returns the tweets and the cursor of the next page
+        (None on the last page), like database.tweets.search_tweets.
+        """
+        query = Query(text)
+        terms = self._query_terms(query)
+        if not terms:
+            return [], None
+        idfs = {term: self._idf(term) for term in terms}
+        # Only the k best (plus one, to know whether there is a next page) are kept
+        best = []
+
+        def offer(doc_id, tfs):
+            if not self._accepts(doc_id, query):
+                return
+            entry = (self._rank(doc_id, tfs, idfs), self.docs[doc_id]["tweet_id"], doc_id)
+            if after is not None and entry[:2] >= after:
+                return
+            if len(best) <= limit:
+                heapq.heappush(best, entry)
+            elif entry > best[0]:
+                heapq.heapreplace(best, entry)
+
+        for doc_id, tfs in self._delta_matches(terms):
+            offer(doc_id, tfs)
+
+        # Main segment documents come in score order, which bounds the rank of everything left
+        max_text_rank = sum(idfs[term] * self.max_tf_factor.get(term, 0) for term in terms)
+        for doc_id, tfs in self._main_matches(terms):
+            if len(best) > limit:
+                doc = self.docs[doc_id]
+                if self.ranking == 'score':
+                    if (doc["tweet_score"], doc["tweet_id"]) < best[0][:2]:
+                        break
+                elif max_text_rank + self.score_weight * self._normalized_score(doc["tweet_score"]) < best[0][0]:
+                    break
+            offer(doc_id, tfs)
+
+        ranked = sorted(best, reverse=True)
+        page = [self.docs[doc_id] for _, _, doc_id in ranked[:limit]]
+        if len(ranked) <= limit:
+            return page, None
+        rank, tweet_id, _ = ranked[limit - 1]
+        return page, encode_cursor(rank, tweet_id)
+
+    def stats(self):
+        return {
+            "ranking": self.ranking,
+            "documents": len(self.docs) - len(self.deleted),
+            "delta_documents": len(self.docs) - self.main_size,
+            "terms": len(self.vocabulary),
+            "posting_bytes": sum(len(postings) for postings in self.postings.values()),
+        }
+
+
+@timed_query('mongo')
+async def load_from_mongo(tweets_collection):
+    """Every tweet with the fields the engine indexes and returns"""
+    return await tweets_collection.find({}, ENGINE_PROJECTION).to_list()
+
+
+def load_from_corpus(paths):
+    """
+    Read raw corpus files (one tweet JSON per line) into tweets collection documents, following
+    the tweet data processor: retweets count towards their source tweet and scores are 0.6 * retweets + 0.4 * likes.
+    """
+    tweets = {}
+    for path in paths:
+        for chunk in read_corpus(path):
+            for tweet, source in chunk.tweets:
+                if tweet["tweet_id"] in tweets:
+                    continue
+                if source is not None:
+                    tweets.setdefault(source["tweet_id"], source)["retweet_count"] += 1
+                tweets[tweet["tweet_id"]] = tweet
+    for tweet in tweets.values():
+        tweet["tweet_score"] = 0.6 * tweet["retweet_count"] + 0.4 * tweet["likes_count"]
+    return list(tweets.values())
@@ -0,0 +1,146 @@
+"""
+Streaming trending hashtags: approximate top-k counts over the whole stream and over sliding
+windows (last hour, last day), in bounded memory.
+
+Each time bucket keeps a Space-Saving summary of at most `capacity` hashtags, so memory is
+capacity * (buckets per day + 1) entries however many tweets are seen. Counts can be
+overestimated by at most the smallest count of a full summary, the heavy hitters are exact or close.
+
+Windows end at the newest tweet seen rather than at the wall clock, so replaying an old corpus
+still yields meaningful hour and day windows.
+"""
+import heapq
+from collections import deque
+from datetime import datetime, timezone
+
+from monitoring.metrics import timed_query
+
+WINDOWS = {'hour': 3600, 'day': 86400}
+FOLLOW_PROJECTION = {"_id": 1, "hashtag": 1, "created_at": 1}
+
+
+class SpaceSaving:
+    """Space-Saving heavy hitters: when full, a new item replaces the least counted one and inherits its count"""
+
+    def __init__(self, capacity=1000):
+        self.capacity = capacity
+        self.counts = {}
+        # Min-heap of (count, item), entries go stale when an item is incremented and are skipped on pop
+        self.heap = []
+
+    def offer(self, item, count=1):
+        if item in self.counts:
+            self.counts[item] += count
+        elif len(self.counts) < self.capacity:
+            self.counts[item] = count
+        else:
+            while True:
+                min_count, min_item = heapq.heappop(self.heap)
+                if self.counts.get(min_item) == min_count:
+                    break
+            del self.counts[min_item]
+            self.counts[item] = min_count + count
+        heapq.heappush(self.heap, (self.counts[item], item))
+        if len(self.heap) > 4 * self.capacity:
+            self.heap = [(count, item) for item, count in self.counts.items()]
+            heapq.heapify(self.heap)
+
+    def top(self, limit=10):
+        return heapq.nlargest(limit, self.counts.items(), key=lambda entry: entry[1])
+
+
+class TrendingHashtags:
+    def __init__(self, bucket_seconds=300, capacity=1000, windows=WINDOWS):
+        self.bucket_seconds = bucket_seconds
+        self.capacity = capacity
+        self.windows = windows
+        self.all_time = SpaceSaving(capacity)
+        # (bucket start, summary) pairs, oldest first, covering the longest window
+        self.buckets = deque()
+        self.newest = 0
+        # _id of the last tweet counted, follow_tweets resumes after it
+        self.last_tweet_id = None
+        self.version = 0
+        self.top_cache = {}
+
+    def add(self, hashtags, timestamp):
+        """Count the hashtags of one tweet posted at timestamp (seconds since the epoch)"""
+        if not hashtags:
+            return
+        bucket_start = int(timestamp) - int(timestamp) % self.bucket_seconds
+        summary = self._bucket(bucket_start)
+        for hashtag in hashtags:
+            self.all_time.offer(hashtag)
+            if summary is not None:
+                summary.offer(hashtag)
+        self.version += 1
+
+    def _bucket(self, bucket_start):
+        """The summary of a bucket, None if the bucket is already outside every window"""
+        if bucket_start > self.newest:
+            self.newest = bucket_start
+            oldest_kept = bucket_start - max(self.windows.values())
+            while self.buckets and self.buckets[0][0] <= oldest_kept:
+                self.buckets.popleft()
+        elif bucket_start <= self.newest - max(self.windows.values()):
+            return None
+        if self.buckets and self.buckets[-1][0] == bucket_start:
+            return self.buckets[-1][1]
+        if not self.buckets or self.buckets[-1][0] < bucket_start:
+            self.buckets.append((bucket_start, SpaceSaving(self.capacity)))
+            return self.buckets[-1][1]
+        # Out of order tweet: find its bucket, buckets are few so a scan is fine
+        for index, (start, summary) in enumerate(self.buckets):
+            if start == bucket_start:
+                return summary
+            if start > bucket_start:
+                self.buckets.insert(index, (bucket_start, SpaceSaving(self.capacity)))
+                return self.buckets[index][1]
+
+    def top(self, window='all', limit=10):
+        """(hashtag, approximate count) pairs, most used first. Cached until the next add()"""
+        cache_key = (window, limit)
+        cached = self.top_cache.get(cache_key)
+        if cached is not None and cached[0] == self.version:
+            return cached[1]
+        if window == 'all':
+            result = self.all_time.top(limit)
+        else:
+            if window not in self.windows:
+                raise ValueError(f"Unknown window: {window}, expected all or one of {', '.join(self.windows)}")
+            window_start = self.newest + self.bucket_seconds - self.windows[window]
+            counts = {}
+            for bucket_start, summary in self.buckets:
+                if bucket_start < window_start:
+                    continue
+                for hashtag, count in summary.counts.items():
+                    counts[hashtag] = counts.get(hashtag, 0) + count
+            result = heapq.nlargest(limit, counts.items(), key=lambda entry: entry[1])
+        self.top_cache[cache_key] = (self.version, result)
+        return result
+
+
+def tweet_timestamp(created_at):
+    """Seconds since the epoch of a tweets collection created_at ("%Y-%m-%d %H:%M:%S", UTC)"""
+    return datetime.strptime(created_at, "%Y-%m-%d %H:%M:%S").replace(tzinfo=timezone.utc).timestamp()
+
+
+@timed_query('mongo')
+async def follow_tweets(tweets_collection, trending, projection=FOLLOW_PROJECTION, on_tweet=None):
+    """
+    Feed every tweet inserted since the last call (all of them on the first) into the trending counts.
+    trending.last_tweet_id moves forward with each tweet, so if the cursor fails partway through,
+    the next call resumes after the last tweet counted instead of counting the same tweets twice.
+    on_tweet(tweet) is also called with every tweet read, so other indexes can follow the same poll
+    (projection then has to include the fields they need on top of FOLLOW_PROJECTION).
+    """
+    query = {"_id": {"$gt": trending.last_tweet_id}} if trending.last_tweet_id is not None else {}
+    cursor = tweets_collection.find(query, projection).sort("_id", 1)
+    async for tweet in cursor:
+        trending.last_tweet_id = tweet["_id"]
+        if on_tweet is not None:
+            on_tweet(tweet)
+        try:
+            trending.add(tweet.get("hashtag"), tweet_timestamp(tweet["created_at"]))
+        except (KeyError, TypeError, ValueError):
+            continue
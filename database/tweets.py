@@ -0,0 +1,68 @@
+from database.pagination import fetch_page, page_query, DEFAULT_PAGE_SIZE, KEYSET_SORT
+from monitoring.metrics import timed_query
+
+# The fields create_tweet_object reads, every tweet query fetches only these
+TWEET_FIELDS = ("user_name", "user_screen_name", "created_at", "text", "retweet_count", "likes_count", "hashtag")
+TWEET_PROJECTION = {"_id": 0, **{field: 1 for field in TWEET_FIELDS}}
+# Paginated queries also need the keyset fields to build the next cursor
+PAGE_PROJECTION = {**{field: 1 for field in TWEET_FIELDS}, "tweet_score": 1}
+
+# Each query is described once as find() arguments, so the endpoints and the
+# query plan check in database/indexes.py run exactly the same query
+
+
+def recent_tweets_query(limit=10):
+    return {"filter": {}, "projection": TWEET_PROJECTION, "sort": [("created_at", -1)], "limit": limit}
+
+
+def trending_tweets_query(limit=10):
+    return {"filter": {}, "projection": TWEET_PROJECTION, "sort": [("tweet_score", -1)], "limit": limit}
+
+
+def tweets_by_hashtag_query(hashtag, limit=10):
+    return {"filter": {"hashtag": hashtag}, "projection": TWEET_PROJECTION, "sort": [("tweet_score", -1)],
+            "limit": limit}
+
+
+def tweets_by_screen_name_query(screen_name, limit=DEFAULT_PAGE_SIZE, after=None):
+    return page_query({"user_screen_name": screen_name}, limit, after, PAGE_PROJECTION)
+
+
+def search_tweets_query(text, limit=DEFAULT_PAGE_SIZE, after=None):
+    return page_query({"$text": {"$search": text}}, limit, after, PAGE_PROJECTION)
+
+
+@timed_query('mongo')
+async def get_recent_tweets(tweets_collection, limit=10):
+    return await tweets_collection.find(**recent_tweets_query(limit)).to_list()
+
+
+@timed_query('mongo')
+async def get_trending_tweets(tweets_collection, limit=10):
+    return await tweets_collection.find(**trending_tweets_query(limit)).to_list()
+
+
+@timed_query('mongo')
+async def get_tweets_by_screen_name(tweets_collection, screen_name, limit=DEFAULT_PAGE_SIZE, after=None):
+    """One page of a user's tweets, best scored first"""
+    return await fetch_page(tweets_collection, tweets_by_screen_name_query(screen_name, limit, after), limit)
+
+
+@timed_query('mongo')
+async def get_tweets_by_hashtag(tweets_collection, hashtag, limit=10):
+    return await tweets_collection.find(**tweets_by_hashtag_query(hashtag, limit)).to_list()
+
+
+@timed_query('mongo')
+async def search_tweets(tweets_collection, text, limit=DEFAULT_PAGE_SIZE, after=None):
+    """One page of the tweets matching a free-text search, best scored first"""
+    return await fetch_page(tweets_collection, search_tweets_query(text, limit, after), limit)
+
+
+def iter_search_tweets(tweets_collection, text):
+    """Cursor over every matching tweet, for clients that stream the full result"""
+    return tweets_collection.find({"$text": {"$search": text}}, TWEET_PROJECTION).sort(KEYSET_SORT)
+
+
+def iter_tweets_by_screen_name(tweets_collection, screen_name):
+    return tweets_collection.find({"user_screen_name": screen_name}, TWEET_PROJECTION).sort(KEYSET_SORT)
@@ -0,0 +1,157 @@
+"""
+In-memory screen name search, replacing ilike('screen_name', '%term%') on the users table.
+
+Every 1, 2 and 3 character gram of '^' + screen_name (lowercased) has a posting list of users,
+kept sorted the way the search endpoint ranks them (followers, then tweets, then verified).
+A query of up to three characters is a single gram, its top k users are the first k entries of
+the posting. Longer queries walk the shortest posting of their trigrams in rank order and stop
+after k users whose screen name really contains the query. The '^' anchor makes prefix queries
+work the same way.
+"""
+import asyncio
+from bisect import bisect_left, insort
+
+from database.connections import supabase_limiter
+from database.corpus_reader import read_corpus
+from database.users import USER_COLUMNS
+from monitoring.metrics import timed_query
+
+ANCHOR = '^'
+GRAM_SIZE = 3
+PAGE_SIZE = 1000
+
+
+def user_grams(text):
+    grams = set()
+    for size in range(1, GRAM_SIZE + 1):
+        grams.update(text[i:i + size] for i in range(len(text) - size + 1))
+    return grams
+
+
+def rank_key(user):
+    """Sort key of the /filterby @ search: most followers, then most tweets, then verified first"""
+    return (-(user.get('followers_count') or 0), -(user.get('tweets_count') or 0), not user.get('verified'),
+            user.get('screen_name') or '')
+
+
+class UserIndex:
+    def __init__(self):
+        self.users = []
+        self.keys = []
+        self.slots = {}
+        self.postings = {}
+        self.ranked = []
+        self.last_id = 0
+        self.ready = False
+
+    def __len__(self):
+        return len(self.slots)
+
+    def build(self, users):
+        """Index all users at once into an empty index. Sorting once is much faster than adding them one by one"""
+        latest = {}
+        for user in users:
+            latest[user.get('user_id') or user.get('id')] = user
+        for user_id, user in sorted(latest.items(), key=lambda item: rank_key(item[1])):
+            slot = len(self.users)
+            self.users.append(user)
+            self.keys.append(rank_key(user))
+            self.slots[user_id] = slot
+            self.ranked.append(slot)
+            for gram in user_grams(ANCHOR + (user.get('screen_name') or '').lower()):
+                self.postings.setdefault(gram, []).append(slot)
+            if isinstance(user.get('id'), int):
+                self.last_id = max(self.last_id, user['id'])
+
+    def add(self, user):
+        """Index a users table row, a row with a known user_id replaces the old one"""
+        user_id = user.get('user_id') or user.get('id')
+        slot = self.slots.get(user_id)
+        if slot is not None:
+            self._unlink(slot)
+            self.users[slot] = user
+            self.keys[slot] = rank_key(user)
+        else:
+            slot = len(self.users)
+            self.users.append(user)
+            self.keys.append(rank_key(user))
+            self.slots[user_id] = slot
+        if isinstance(user.get('id'), int):
+            self.last_id = max(self.last_id, user['id'])
+
+        key = self.keys.__getitem__
+        insort(self.ranked, slot, key=key)
+        for gram in user_grams(ANCHOR + (user.get('screen_name') or '').lower()):
+            insort(self.postings.setdefault(gram, []), slot, key=key)
+
+    def _unlink(self, slot):
+        self._remove_from(self.ranked, slot)
+        for gram in user_grams(ANCHOR + (self.users[slot].get('screen_name') or '').lower()):
+            self._remove_from(self.postings[gram], slot)
+
+    def _remove_from(self, posting, slot):
+        index = bisect_left(posting, self.keys[slot], key=self.keys.__getitem__)
+        while posting[index] != slot:
+            index += 1
+        del posting[index]
+
+    def search(self, text, limit=10, prefix=False):
+        """Users whose screen name contains text (or starts with it when prefix is set), best ranked first"""
+        text = text.lower()
+        query = ANCHOR + text if prefix else text
+        if not text:
+            return [self.users[slot] for slot in self.ranked[:limit]]
+        if len(query) <= GRAM_SIZE:
+            return [self.users[slot] for slot in self.postings.get(query, [])[:limit]]
+
+        grams = [query[i:i + GRAM_SIZE] for i in range(len(query) - GRAM_SIZE + 1)]
+        shortest = min((self.postings.get(gram, []) for gram in grams), key=len)
+        matches = []
+        for slot in shortest:
+            screen_name = (self.users[slot].get('screen_name') or '').lower()
+            if screen_name.startswith(text) if prefix else text in screen_name:
+                matches.append(self.users[slot])
+                if len(matches) == limit:
+                    break
+        return matches
+
+
+@timed_query('supabase')
+async def load_from_supabase(supabase, user_index, rebuild=False):
+    """
+    Add the users inserted since the last load (by the serial id) and return the index with the number
+    of users read. Until the index is ready, and when rebuild is set, the whole table is read into a new
+    index, built in a thread: the table has no column to poll updated rows by, so rebuilding is how new
+    follower and tweet counts of existing users get in. The caller swaps the returned index in.
+    """
+    rebuild = rebuild or not user_index.ready
+    last_id = 0 if rebuild else user_index.last_id
+    users = []
+    while True:
+        async with supabase_limiter:
+            response = await supabase.table('users').select('user_id,' + USER_COLUMNS).gt(
+                'id', last_id).order('id').limit(PAGE_SIZE).execute()
+        users.extend(response.data)
+        if len(response.data) < PAGE_SIZE:
+            break
+        last_id = response.data[-1]['id']
+
+    if rebuild:
+        # Building 200k users takes seconds, which would stall every request on the event loop
+        user_index = UserIndex()
+        await asyncio.to_thread(user_index.build, users)
+    else:
+        for user in users:
+            user_index.add(user)
+    return user_index, len(users)
+
+
+def load_from_corpus(paths):
+    """Index the authors of raw corpus files (one tweet JSON per line) into a new index"""
+    users = []
+    for path in paths:
+        for chunk in read_corpus(path):
+            users.extend(chunk.users)
+    user_index = UserIndex()
+    user_index.build(users)
+    return user_index
@@ -0,0 +1,22 @@
+from database.connections import supabase_limiter
+from monitoring.metrics import timed_query
+
+USER_COLUMNS = 'id,name,screen_name,verified,location,description,followers_count,friends_count,tweets_count'
+
+
+@timed_query('supabase')
+async def get_trending_users(supabase, limit=10):
+    async with supabase_limiter:
+        response = await supabase.table('users').select(USER_COLUMNS).order(
+            'followers_count', desc=True).order('tweets_count', desc=True).limit(limit).execute()
+    return response.data
+
+
+@timed_query('supabase')
+async def search_users(supabase, screen_name, limit=10):
+    """Users whose screen name contains the search string, most followed first"""
+    async with supabase_limiter:
+        response = await supabase.table('users').select('*').ilike('screen_name', f'%{screen_name}%').order(
+            'followers_count', desc=True).order('tweets_count', desc=True).order(
+            'verified', desc=True).limit(limit).execute()
+    return response.data
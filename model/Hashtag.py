@@ -1,7 +1,14 @@
+from dataclasses import dataclass
+
+from model.pickling import set_slots_state
+
+
+@dataclass(slots=True)
 class Hashtag:
-    def __init__(self, hashtag, count):
-        self.hashtag = hashtag
-        self.count = count
+    hashtag: str
+    count: str
+
+    __setstate__ = set_slots_state
 
 
 def create_hashtag_object(key, value):
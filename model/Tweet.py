@@ -1,19 +1,38 @@
-from datetime import datetime
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from functools import lru_cache
 
+from model.pickling import set_slots_state
+
+MONTHS = ['Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun', 'Jul', 'Aug', 'Sep', 'Oct', 'Nov', 'Dec']
+
+
+@dataclass(slots=True)
 class Tweet:
-    def __init__(self,user_name,user_id,created_at,text,retweet_count,likes_count,hashtags):
-        self.user_name = user_name
-        self.user_id = user_id
-        self.created_at = created_at
-        self.text = text
-        self.retweet_count = retweet_count
-        self.likes_count = likes_count
-        self.hashtags = hashtags
+    user_name: str
+    user_id: str
+    created_at: str
+    text: str
+    retweet_count: int
+    likes_count: int
+    hashtags: list
+
+    __setstate__ = set_slots_state
+
+
+@lru_cache(maxsize=65536)
+def format_created_at(created_at):
+    """
+    A stored created_at ("%Y-%m-%d %H:%M:%S" string or epoch seconds) as shown in the UI, "%d %b, %Y %I:%M%p".
+    Tweets of the same second share one formatted string instead of going through strptime and strftime each.
+    """
+    if isinstance(created_at, (int, float)):
+        created_at = datetime.fromtimestamp(created_at, timezone.utc).strftime("%Y-%m-%d %H:%M:%S")
+    hour = int(created_at[11:13])
+    return (f"{created_at[8:10]} {MONTHS[int(created_at[5:7]) - 1]}, {created_at[0:4]} "
+            f"{(hour - 1) % 12 + 1:02d}:{created_at[14:16]}{'AM' if hour < 12 else 'PM'}")
 
 
 def create_tweet_object(tweet):
-    return Tweet(user_name=tweet["user_name"], user_id="@" + tweet["user_screen_name"],
-          created_at=datetime.strptime(tweet["created_at"], "%Y-%m-%d %H:%M:%S").strftime(
-              "%d %b, %Y %I:%M%p"),
-          text=tweet["text"], retweet_count=tweet["retweet_count"], likes_count=tweet["likes_count"],
-          hashtags=tweet["hashtag"])
+    return Tweet(tweet["user_name"], "@" + tweet["user_screen_name"], format_created_at(tweet["created_at"]),
+                 tweet["text"], tweet["retweet_count"], tweet["likes_count"], tweet["hashtag"])
@@ -0,0 +1,84 @@
+from array import array
+from operator import itemgetter
+
+import orjson
+
+from model.Tweet import format_created_at
+
+
+class Interned(dict):
+    """Maps each distinct value to one shared derived string, computed the first time the value is seen"""
+
+    def __init__(self, derive=None):
+        super().__init__()
+        self.derive = derive
+
+    def __missing__(self, value):
+        derived = self[value] = self.derive(value) if self.derive else value
+        return derived
+
+
+class TweetBatch:
+    """
+    A list of tweets stored column by column instead of one Tweet object per row, for results the
+    cache keeps as objects (CACHE_RESPONSES=false). Counts are machine integers in arrays. User names, user ids, dates and
+    hashtags are interned per batch, so the many tweets of one user or one second reference a
+    single string instead of each holding a copy. Serializes to the same JSON as a list of Tweets.
+    """
+
+    __slots__ = ('user_names', 'user_ids', 'created_at', 'texts', 'retweet_counts', 'likes_counts', 'hashtags',
+                 'hashtag_offsets')
+
+    def __init__(self, user_names=(), user_ids=(), created_at=(), texts=(), retweet_counts=(), likes_counts=(),
+                 hashtags=(), hashtag_offsets=(0,)):
+        self.user_names = list(user_names)
+        self.user_ids = list(user_ids)
+        self.created_at = list(created_at)
+        self.texts = list(texts)
+        self.retweet_counts = array('q', retweet_counts)
+        self.likes_counts = array('q', likes_counts)
+        self.hashtags = list(hashtags)
+        self.hashtag_offsets = array('I', hashtag_offsets)
+
+    @classmethod
+    def from_documents(cls, tweets):
+        """A batch from tweets collection documents (TWEET_FIELDS), decoded one column at a time"""
+        tweets = tweets if isinstance(tweets, list) else list(tweets)
+        hashtags = []
+        hashtag_offsets = [0]
+        interned_hashtags = Interned()
+        for tweet in tweets:
+            if tweet["hashtag"]:
+                hashtags.extend(map(interned_hashtags.__getitem__, tweet["hashtag"]))
+            hashtag_offsets.append(len(hashtags))
+        return cls(
+            map(Interned().__getitem__, map(itemgetter("user_name"), tweets)),
+            map(Interned(lambda screen_name: "@" + screen_name).__getitem__, map(itemgetter("user_screen_name"), tweets)),
+            map(Interned(format_created_at).__getitem__, map(itemgetter("created_at"), tweets)),
+            map(itemgetter("text"), tweets),
+            [tweet["retweet_count"] or 0 for tweet in tweets],
+            [tweet["likes_count"] or 0 for tweet in tweets],
+            hashtags, hashtag_offsets)
+
+    def __len__(self):
+        return len(self.texts)
+
+    def to_json(self):
+        """The batch as a JSON array of tweets, built from the columns in one pass and serialized in one orjson call"""
+        hashtags = self.hashtags
+        offsets = self.hashtag_offsets
+        return orjson.dumps([
+            {"user_name": user_name, "user_id": user_id, "created_at": created_at, "text": text,
+             "retweet_count": retweet_count, "likes_count": likes_count, "hashtags": hashtags[start:end]}
+            for user_name, user_id, created_at, text, retweet_count, likes_count, start, end in zip(
+                self.user_names, self.user_ids, self.created_at, self.texts, self.retweet_counts, self.likes_counts,
+                offsets, offsets[1:])
+        ])
+
+    def __getstate__(self):
+        # Pickle writes a string referenced several times once, so a cached batch stays interned
+        return tuple(getattr(self, name) for name in self.__slots__)
+
+    def __setstate__(self, state):
+        for name, value in zip(self.__slots__, state):
+            setattr(self, name, value)
@@ -1,10 +1,18 @@
+from dataclasses import dataclass
+
+from model.pickling import set_slots_state
+
+
+@dataclass(slots=True)
 class User:
-    def __init__(self,user_name,user_id,verified,description):
-        self.user_name = user_name
-        self.user_id = user_id
-        self.verified = verified
-        self.description = description
+    user_name: str
+    user_id: str
+    verified: bool
+    description: str
+
+    __setstate__ = set_slots_state
 
 
 def create_user_object(user):
-    return User(user_name=user[1], user_id="@"+user[2], verified=user[3], description=user[5])
\ No newline at end of file
+    """A User from a users table row (a Supabase row or a user index entry)"""
+    return User(user.get('name'), "@" + user['screen_name'], user.get('verified'), user.get('description'))
@@ -0,0 +1,9 @@
+def set_slots_state(obj, state):
+    """
+    __setstate__ for the slots dataclasses. Objects pickled before the models used __slots__
+    (e.g. in an old cache checkpoint) carry their plain __dict__, newer ones a (None, slots) pair.
+    """
+    if isinstance(state, tuple):
+        state = state[1]
+    for name, value in state.items():
+        setattr(obj, name, value)
@@ -0,0 +1,36 @@
+"""
+Response schemas of the API, for the OpenAPI docs only. Handlers return pre-serialized bodies
+(orjson writes the slots dataclasses in model/ directly), so these are never used to validate
+or encode a response at runtime.
+"""
+from typing import List, Union
+
+from pydantic import BaseModel
+
+
+class TweetSchema(BaseModel):
+    user_name: str
+    user_id: str
+    created_at: str
+    text: str
+    retweet_count: int
+    likes_count: int
+    hashtags: List[str]
+
+
+class UserSchema(BaseModel):
+    user_name: str
+    user_id: str
+    verified: bool
+    description: str
+
+
+class HashtagSchema(BaseModel):
+    hashtag: str
+    count: str
+
+
+TWEETS_RESPONSE = {200: {"model": List[TweetSchema]}}
+USERS_RESPONSE = {200: {"model": List[UserSchema]}}
+HASHTAGS_RESPONSE = {200: {"model": List[HashtagSchema]}}
+TWEETS_OR_USERS_RESPONSE = {200: {"model": Union[List[TweetSchema], List[UserSchema]]}}
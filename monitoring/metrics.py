@@ -0,0 +1,242 @@
+"""
+In-process metrics in the Prometheus text format, served by search.py on /metrics.
+
+Counters, gauges and histograms are plain Python objects: a labeled child is looked up once per
+label combination and updating it is an attribute increment (a bisect for histograms), so the
+instrumentation can stay on at full load. Every worker process keeps its own values, Prometheus
+scrapes each worker or sums them by instance.
+
+    REQUESTS.labels('/filterby', 'GET', '200').inc()
+    DB_QUERY_DURATION.labels('mongo', 'search_tweets').observe(0.012)
+    generate_latest()   # the exposition text of every registered metric
+"""
+import functools
+import time
+from bisect import bisect_left
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SIZE_BUCKETS = (100, 1000, 10000, 100000, 1000000, 10000000)
+
+REGISTRY = []
+
+
+def escape_label_value(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def format_labels(names, values, extra=''):
+    pairs = [f'{name}="{escape_label_value(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class CounterChild:
+    __slots__ = ('value',)
+
+    def __init__(self):
+        self.value = 0
+
+    def inc(self, amount=1):
+        self.value += amount
+
+
+class GaugeChild(CounterChild):
+    __slots__ = ()
+
+    def dec(self, amount=1):
+        self.value -= amount
+
+    def set(self, value):
+        self.value = value
+
+
+class HistogramChild:
+    __slots__ = ('bounds', 'counts', 'sum')
+
+    def __init__(self, bounds):
+        self.bounds = bounds
+        # One count per bucket plus the +Inf bucket, cumulated only when exposed
+        self.counts = [0] * (len(bounds) + 1)
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.sum += value
+
+
+class Metric:
+    kind = None
+    child_class = None
+
+    def __init__(self, name, documentation, labelnames=(), register=True):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.children = {}
+        if register:
+            REGISTRY.append(self)
+
+    def _new_child(self):
+        return self.child_class()
+
+    def labels(self, *values):
+        child = self.children.get(values)
+        if child is None:
+            if len(values) != len(self.labelnames):
+                raise ValueError(f"{self.name} expects labels {self.labelnames}, got {values}")
+            child = self.children[values] = self._new_child()
+        return child
+
+    def samples(self):
+        for values, child in list(self.children.items()):
+            yield self.name, format_labels(self.labelnames, values), child.value
+
+    def expose(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        lines.extend(f"{name}{labels} {format_value(value)}" for name, labels, value in self.samples())
+        return lines
+
+
+class Counter(Metric):
+    kind = 'counter'
+    child_class = CounterChild
+
+
+class Gauge(Metric):
+    kind = 'gauge'
+    child_class = GaugeChild
+
+
+class Histogram(Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS, register=True):
+        self.buckets = tuple(sorted(buckets))
+        super().__init__(name, documentation, labelnames, register)
+
+    def _new_child(self):
+        return HistogramChild(self.buckets)
+
+    def samples(self):
+        for values, child in list(self.children.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), child.counts):
+                cumulative += count
+                yield (self.name + '_bucket', format_labels(self.labelnames, values, f'le="{format_value(bound)}"'),
+                       cumulative)
+            yield self.name + '_sum', format_labels(self.labelnames, values), child.sum
+            yield self.name + '_count', format_labels(self.labelnames, values), cumulative
+
+
+class CallbackGauge(Metric):
+    """A gauge read when metrics are scraped: callback() returns {label values tuple: value}"""
+    kind = 'gauge'
+
+    def __init__(self, name, documentation, labelnames=(), callback=None, register=True):
+        super().__init__(name, documentation, labelnames, register)
+        self.callback = callback
+
+    def samples(self):
+        try:
+            values = self.callback() if self.callback else {}
+        except Exception as e:
+            print(f"Error collecting {self.name}: {e}")
+            return
+        for label_values, value in values.items():
+            if isinstance(value, (int, float)) and not isinstance(value, bool):
+                yield self.name, format_labels(self.labelnames, label_values), value
+
+
+def generate_latest():
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.expose())
+    return ('\n'.join(lines) + '\n').encode('utf-8')
+
+
+REQUESTS = Counter('http_requests_total', 'HTTP requests by route, method and status', ('route', 'method', 'status'))
+REQUEST_DURATION = Histogram('http_request_duration_seconds', 'HTTP request latency by route', ('route',))
+REQUESTS_IN_FLIGHT = Gauge('http_requests_in_flight', 'HTTP requests being handled by route', ('route',))
+RESPONSE_SIZE = Histogram('http_response_size_bytes', 'HTTP response body size by route', ('route',),
+                          buckets=SIZE_BUCKETS)
+CACHE_LOOKUPS = Counter('cache_lookups_total', 'Cache lookups by cache, key namespace and result (hit or miss)',
+                        ('cache', 'namespace', 'result'))
+CACHE_EVICTIONS = Counter('cache_evictions_total', 'Entries evicted to make room, by cache and key namespace',
+                          ('cache', 'namespace'))
+DB_QUERY_DURATION = Histogram('db_query_duration_seconds', 'Database call latency by backend and operation',
+                              ('backend', 'operation'))
+DB_QUERY_ERRORS = Counter('db_query_errors_total', 'Database calls that raised, by backend and operation',
+                          ('backend', 'operation'))
+
+
+def timed_query(backend):
+    """Decorator recording the latency (and failures) of an async database call under its function name"""
+    def decorate(function):
+        duration = DB_QUERY_DURATION.labels(backend, function.__name__)
+        errors = DB_QUERY_ERRORS.labels(backend, function.__name__)
+
+        @functools.wraps(function)
+        async def wrapper(*args, **kwargs):
+            start_time = time.perf_counter()
+            try:
+                return await function(*args, **kwargs)
+            except Exception:
+                errors.inc()
+                raise
+            finally:
+                duration.observe(time.perf_counter() - start_time)
+        return wrapper
+    return decorate
+
+
+class MetricsMiddleware:
+    """
+    ASGI middleware counting and timing every HTTP request by route. Routes are the app's route
+    paths, any other path is counted as 'other' so scanners cannot blow up the label set.
+    """
+
+    def __init__(self, app):
+        self.app = app
+        self.routes = None
+
+    def _route(self, scope):
+        if self.routes is None:
+            app = scope.get('app')
+            self.routes = {route.path for route in getattr(app, 'routes', []) if hasattr(route, 'path')}
+        return scope['path'] if scope['path'] in self.routes else 'other'
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+
+        route = self._route(scope)
+        in_flight = REQUESTS_IN_FLIGHT.labels(route)
+        status = 500
+        size = 0
+
+        async def send_and_measure(message):
+            nonlocal status, size
+            if message['type'] == 'http.response.start':
+                status = message['status']
+            elif message['type'] == 'http.response.body':
+                size += len(message.get('body', b''))
+            await send(message)
+
+        in_flight.inc()
+        start_time = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_and_measure)
+        finally:
+            in_flight.dec()
+            REQUEST_DURATION.labels(route).observe(time.perf_counter() - start_time)
+            RESPONSE_SIZE.labels(route).observe(size)
+            REQUESTS.labels(route, scope['method'], str(status)).inc()
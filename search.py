@@ -1,20 +1,75 @@
-import pymongo
+import asyncio
+import math
 import time
 import os
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
+from fastapi.responses import Response, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
-from supabase import create_client, Client
 from dotenv import load_dotenv
 
 from model.Tweet import create_tweet_object
 from model.User import create_user_object
 from model.Hashtag import create_hashtag_object
+from model.TweetBatch import TweetBatch
+from model.schemas import TWEETS_RESPONSE, USERS_RESPONSE, HASHTAGS_RESPONSE, TWEETS_OR_USERS_RESPONSE
 from cache.custom_cache import Cache
+from cache.redis_cache import RedisCache
+from cache.tiered_cache import TieredCache
+from cache.response_cache import create_cached_response, to_response, encode_items, json_response
+from cache.key_index import page_cache_key
+from cache.single_flight import SingleFlight
+from cache.materialized_views import ViewRefresher
+from database.connections import connect_to_mongodb, connect_to_supabase
+from database import tweets as tweet_queries
+from database import users as user_queries
+from database.pagination import decode_cursor, clamp_page_size, DEFAULT_PAGE_SIZE
+from database import search_engine as search_engine_module
+from database.search_engine import SearchEngine
+from database import user_index as user_index_module
+from database.user_index import UserIndex
+from database.trending_hashtags import TrendingHashtags, follow_tweets, WINDOWS, FOLLOW_PROJECTION
+from monitoring.metrics import MetricsMiddleware, CallbackGauge, generate_latest, CONTENT_TYPE
 
 # Load environment variables
 load_dotenv()
 
-app = FastAPI(title="Twitter Search API", version="1.0.0")
+# Initialize database connections. Both clients are async, so a slow query only
+# suspends its own request instead of blocking the worker's event loop.
+mongo_client = connect_to_mongodb()
+supabase = None
+
+# Initialize database objects
+if mongo_client:
+    db = mongo_client["twitter-database"]
+    tweets_collection = db["tweets"]
+else:
+    tweets_collection = None
+
+
+@asynccontextmanager
+async def lifespan(app):
+    # The async Supabase client can only be created inside the event loop
+    global supabase
+    supabase = await connect_to_supabase()
+    if supabase:
+        trending_views.register('trendingusers', load_trending_users, trending_refresh_interval)
+    trending_views.start()
+    if search_engine is not None:
+        engine_task = asyncio.create_task(build_search_engine())
+    user_index_task = asyncio.create_task(follow_users())
+    sweep_task = asyncio.create_task(sweep_expired_entries())
+    yield
+    await trending_views.stop()
+    user_index_task.cancel()
+    sweep_task.cancel()
+    if search_engine is not None:
+        engine_task.cancel()
+    if mongo_client:
+        await mongo_client.close()
+
+
+app = FastAPI(title="Twitter Search API", version="1.0.0", lifespan=lifespan)
 
 origins = [
     "http://localhost",
@@ -29,44 +84,286 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "X-Refreshed-At", "X-Data-Age", "X-Stale"],
 )
 
+# Per-route request counts, latency and response size histograms for /metrics, METRICS_ENABLED=false turns them off
+if os.getenv('METRICS_ENABLED', 'true').lower() == 'true':
+    app.add_middleware(MetricsMiddleware)
 
-# Connect to Tweet Database
-client = pymongo.MongoClient(os.getenv('MONGODB_URI'))
-db = client["twitter-database"]
-tweets_collection = db["tweets"]
 
+# Initialize cache
+def create_cache():
+    """Create the cache selected by CACHE_BACKEND: memory (default), redis or tiered (in-process L1 + Redis L2)"""
+    backend = os.getenv('CACHE_BACKEND', 'memory')
+    if backend == 'redis':
+        return RedisCache()
+    if backend == 'tiered':
+        return TieredCache()
+    return Cache()
 
-# Connect to User Database (Supabase)
-def connect_to_supabase():
-    """Connect to Supabase database"""
-    try:
-        supabase_url = os.getenv('SUPABASE_URL')
-        supabase_key = os.getenv('SUPABASE_ANON_KEY')
-        if not supabase_url or not supabase_key:
-            raise ValueError("SUPABASE_URL and SUPABASE_ANON_KEY must be set")
-        
-        supabase: Client = create_client(supabase_url, supabase_key)
-        print("Connected to Supabase database")
-        return supabase
-    except Exception as e:
-        print(f"Error occurred while connecting to Supabase: {e}")
-        return None
-
-# Initialize database connections
-mongo_client = connect_to_mongodb()
-supabase = connect_to_supabase()
 
-# Initialize database objects
-if mongo_client:
-    db = mongo_client["twitter-database"]
-    tweets_collection = db["tweets"]
-else:
-    tweets_collection = None
+cache = create_cache()
 
-# Initialize cache
-cache = Cache()
+# Lookups and puts only expire the entries they touch, this sweep removes the ones nobody asks for again
+cache_sweep_interval = int(os.getenv('CACHE_SWEEP_INTERVAL', '60'))
+
+
+async def sweep_expired_entries():
+    while True:
+        await asyncio.sleep(cache_sweep_interval)
+        try:
+            await cache.sweep_expired()
+        except Exception as e:
+            print(f"Error sweeping expired cache entries: {e}")
+
+
+def create_single_flight():
+    """Coalesce cache misses per worker, and across workers through a Redis lock when Redis is in use"""
+    redis_cache = cache.l2 if isinstance(cache, TieredCache) else cache
+    if isinstance(redis_cache, RedisCache) and redis_cache.redis_client is not None:
+        return SingleFlight(redis_cache.get_async_client())
+    return SingleFlight()
+
+
+single_flight = create_single_flight()
+
+# Cache the serialized JSON body of a response instead of the model objects it was built from,
+# so hits skip pickling and jsonable_encoder. CACHE_RESPONSES=false caches the objects as before.
+cache_responses = os.getenv('CACHE_RESPONSES', 'true').lower() == 'true'
+compress_cached_responses = os.getenv('COMPRESS_CACHED_RESPONSES', 'false').lower() == 'true'
+
+
+async def cache_result(key, items, headers=None):
+    """Cache a result list and return what the handler should respond with"""
+    # Pages carry their next cursor in a header, so they are always cached as responses
+    if not cache_responses and headers is None:
+        await cache.aput(key, items)
+        return to_response(items)
+    cached_response = create_cached_response(items, compress=compress_cached_responses, headers=headers)
+    await cache.aput(key, cached_response)
+    return to_response(cached_response)
+
+
+async def cached_result(key):
+    """Return the cached response for a key, or None on a miss"""
+    cached = await cache.aget(key)
+    return to_response(cached[0]) if cached else None
+
+
+async def load_once(key, loader):
+    """Run loader() for a cache miss, unless a request for the same key is already running it"""
+    return await single_flight.run(key, loader, lambda: cached_result(key))
+
+
+def create_cached_tweets(tweets):
+    """
+    Tweets for cache_result. When the cache keeps result lists (CACHE_RESPONSES=false) they are decoded
+    into a columnar TweetBatch, which retains about 40% of the memory of Tweet objects. Otherwise they are
+    serialized right away, which is faster from Tweet objects.
+    """
+    if cache_responses:
+        return [create_tweet_object(tweet) for tweet in tweets]
+    return TweetBatch.from_documents(tweets)
+
+
+async def cache_page(key, tweets, next_cursor):
+    """Cache one page of tweets, the cursor of the next page is returned in the X-Next-Cursor header"""
+    headers = {"X-Next-Cursor": next_cursor} if next_cursor else {}
+    return await cache_result(key, [create_tweet_object(tweet) for tweet in tweets], headers)
+
+
+def cache_stat_values():
+    """The numeric get_cache_stats() values of the cache, nested tiers (l1, l2) prefixed with their name"""
+    values = {}
+    for stat, value in cache.get_cache_stats().items():
+        if isinstance(value, dict):
+            values.update({(f"{stat}_{name}",): tier_value for name, tier_value in value.items()})
+        else:
+            values[(stat,)] = value
+    return values
+
+
+CallbackGauge('cache_stats', 'The statistics get_cache_stats() reports for the response cache', ('stat',),
+              cache_stat_values)
+
+
+# Hashtag counts are kept by a streaming top-k (database/trending_hashtags.py) that is fed the
+# tweets inserted since its last refresh, instead of aggregating the whole collection
+trending_hashtags = TrendingHashtags()
+
+
+def trending_hashtag_objects(window='all'):
+    items = []
+    for key,value in trending_hashtags.top(window):
+        items.append(create_hashtag_object(key, value))
+    return items
+
+
+async def load_trending_hashtags():
+    if search_engine is None:
+        await follow_tweets(tweets_collection, trending_hashtags)
+    else:
+        # The first poll reads the whole collection, which build_search_engine indexes in bulk,
+        # later polls also hand their new tweets to the search index
+        first_poll = trending_hashtags.last_tweet_id is None
+        await follow_tweets(tweets_collection, trending_hashtags, SEARCH_FOLLOW_PROJECTION,
+                            None if first_poll else index_new_tweet)
+    return trending_hashtag_objects()
+
+
+async def load_trending_tweets():
+    return [create_tweet_object(tweet) for tweet in await tweet_queries.get_trending_tweets(tweets_collection)]
+
+
+def create_user_objects(rows):
+    return [create_user_object(user_data) for user_data in rows]
+
+
+async def load_trending_users():
+    # Use Supabase to query users table
+    return create_user_objects(await user_queries.get_trending_users(supabase))
+
+
+# The trending endpoints serve top-10 views that are recomputed in the background every
+# TRENDING_REFRESH_INTERVAL seconds, so no request waits on the hashtag aggregation or the users sort
+trending_refresh_interval = int(os.getenv('TRENDING_REFRESH_INTERVAL', '60'))
+trending_views = ViewRefresher()
+CallbackGauge('materialized_view_age_seconds', 'Seconds since each trending view was last refreshed', ('view',),
+              lambda: {(name,): status['age'] for name, status in trending_views.status().items()})
+if tweets_collection is not None:
+    trending_views.register('trendinghashtags', load_trending_hashtags, trending_refresh_interval)
+    trending_views.register('trendingtweets', load_trending_tweets, trending_refresh_interval)
+
+
+# SEARCH_BACKEND=engine answers /filterby text searches from an in-process inverted index
+# (database/search_engine.py) instead of Mongo's $text index. Until the index is built the
+# searches keep going to Mongo. SEARCH_RANKING picks score (the $text order) or bm25.
+search_backend = os.getenv('SEARCH_BACKEND', 'mongo')
+search_ranking = os.getenv('SEARCH_RANKING', 'score')
+# Ingestion keeps updating the retweet counts and scores of existing tweets, which the poll below
+# never sees, so an index built from MongoDB is rebuilt every SEARCH_INDEX_REBUILD_INTERVAL seconds.
+# Rebuilds run in a thread and replace the index when done.
+search_index_rebuild_interval = int(os.getenv('SEARCH_INDEX_REBUILD_INTERVAL', '3600'))
+
+
+def create_search_engine():
+    if search_index_rebuild_interval > 0 and not os.getenv('SEARCH_CORPUS_FILES'):
+        # The rebuilds stand in for compact(), which would otherwise run on the event loop
+        return SearchEngine(ranking=search_ranking, compact_after=math.inf)
+    return SearchEngine(ranking=search_ranking)
+
+
+search_engine = create_search_engine() if search_backend == 'engine' else None
+
+# Tweets inserted after startup reach the index through the trending hashtags poll. The ones polled
+# while an index is being built are also held back, and added to it once it is ready.
+SEARCH_FOLLOW_PROJECTION = {**search_engine_module.ENGINE_PROJECTION, **FOLLOW_PROJECTION}
+pending_engine_tweets = []
+
+
+def index_new_tweet(tweet):
+    if search_engine.ready:
+        search_engine.add(tweet)
+    if pending_engine_tweets is not None:
+        pending_engine_tweets.append(tweet)
+
+
+async def build_search_engine():
+    """Index the tweets from SEARCH_CORPUS_FILES (comma separated raw corpus files) or else from MongoDB"""
+    global search_engine, pending_engine_tweets
+    corpus_files = os.getenv('SEARCH_CORPUS_FILES')
+    while True:
+        start_time = time.time()
+        # Collect the polled tweets from before the documents are read, so none falls in between
+        pending_engine_tweets = []
+        try:
+            if corpus_files:
+                documents = await asyncio.to_thread(search_engine_module.load_from_corpus, corpus_files.split(','))
+            elif tweets_collection is not None:
+                documents = await search_engine_module.load_from_mongo(tweets_collection)
+            else:
+                pending_engine_tweets = None
+                return
+            engine = create_search_engine()
+            await asyncio.to_thread(engine.build, documents)
+            for tweet in pending_engine_tweets:
+                engine.add(tweet)
+            engine.ready = True
+            search_engine = engine
+            print(f"Built the search index over {len(documents)} tweets in {time.time() - start_time} seconds")
+        except Exception as e:
+            print(f"Error building the search index: {e}")
+        # Requests keep using the current index (if any) until the next build, stop holding back tweets
+        pending_engine_tweets = None
+        if corpus_files or search_index_rebuild_interval <= 0:
+            return
+        await asyncio.sleep(search_index_rebuild_interval)
+
+
+# @ searches are answered from an in-memory screen name index (database/user_index.py), since
+# ilike '%term%' cannot use an index. It is built from USER_CORPUS_FILES (comma separated raw
+# corpus files) or from the users table, which is then polled for new users every
+# USER_INDEX_REFRESH_INTERVAL seconds and rebuilt every USER_INDEX_REBUILD_INTERVAL seconds to pick
+# up updated follower and tweet counts. Until it holds any user, searches go to Supabase.
+user_index = UserIndex()
+user_index_refresh_interval = int(os.getenv('USER_INDEX_REFRESH_INTERVAL', '60'))
+user_index_rebuild_interval = int(os.getenv('USER_INDEX_REBUILD_INTERVAL', '3600'))
+
+
+async def follow_users():
+    global user_index
+    last_rebuild = time.time()
+    while True:
+        start_time = time.time()
+        try:
+            corpus_files = os.getenv('USER_CORPUS_FILES')
+            if corpus_files:
+                index = await asyncio.to_thread(user_index_module.load_from_corpus, corpus_files.split(','))
+                index.ready = True
+                user_index = index
+                print(f"Built the user index over {len(user_index)} users in {time.time() - start_time} seconds")
+                return
+            if not supabase:
+                return
+            rebuild = user_index.ready and time.time() - last_rebuild > user_index_rebuild_interval
+            index, added = await user_index_module.load_from_supabase(supabase, user_index, rebuild)
+            # A rebuilt index replaces the old one in a single assignment, searches never see it half built
+            if rebuild:
+                index.ready = True
+                user_index = index
+                last_rebuild = time.time()
+                print(f"Rebuilt the user index over {added} users in {time.time() - start_time} seconds")
+            elif not user_index.ready and added:
+                index.ready = True
+                user_index = index
+                last_rebuild = time.time()
+                print(f"Built the user index over {added} users in {time.time() - start_time} seconds")
+        except Exception as e:
+            print(f"Error loading the user index: {e}")
+        await asyncio.sleep(user_index_refresh_interval)
+
+
+# Streamed results are encoded this many tweets at a time, each batch in a single orjson call
+STREAM_BATCH_SIZE = 500
+
+
+def stream_tweets(cursor):
+    """Stream every tweet of a cursor as one JSON array, without holding the full result in memory"""
+    async def body():
+        yield b'['
+        first = True
+        tweets = []
+        async for tweet in cursor:
+            tweets.append(tweet)
+            if len(tweets) == STREAM_BATCH_SIZE:
+                yield (b'' if first else b',') + encode_items([create_tweet_object(tweet) for tweet in tweets])[1:-1]
+                first = False
+                tweets = []
+        if tweets:
+            yield (b'' if first else b',') + encode_items([create_tweet_object(tweet) for tweet in tweets])[1:-1]
+        yield b']'
+    return StreamingResponse(body(), media_type='application/json')
 
 
 @app.get("/")
@@ -76,194 +373,209 @@ async def root():
         "message": "Twitter Search API is running!",
         "status": "healthy",
         "mongodb": "connected" if mongo_client else "disconnected",
-        "supabase": "connected" if supabase else "disconnected"
+        "supabase": "connected" if supabase else "disconnected",
+        "views": trending_views.status()
     }
 
 
-@app.get("/hashtags")
-async def get_hashtags():
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    """Prometheus metrics of this worker"""
+    return Response(content=generate_latest(), media_type=CONTENT_TYPE)
+
+
+@app.get("/hashtags", responses=HASHTAGS_RESPONSE)
+async def get_hashtags(window: str = 'all'):
+    """Most used hashtags over all tweets, or over the last hour or day of tweets with window=hour|day"""
     start_time = time.time()
-    if cache.get('trendinghashtags'):
-        print(f"Trending hashtags from cache: {time.time() - start_time} seconds")
-        return cache.get('trendinghashtags')[0]
-    
-    if not tweets_collection:
+    if tweets_collection is None:
         return {"error": "MongoDB not connected"}
-    
-    pipeline = [
-        {"$unwind": "$hashtag"},
-        {"$group": {"_id": "$hashtag", "count": {"$sum": 1}}},
-        {"$sort": {"count": -1}},
-        {"$limit": 10}
-    ]
-    top_hashtags = list(tweets_collection.aggregate(pipeline))
-    top_hashtags_dict = {}
-    for hashtag in top_hashtags:
-        top_hashtags_dict[hashtag['_id']] = hashtag['count']
-    trending_hashtags = top_hashtags_dict
-    items = []
-    for key,value in trending_hashtags.items():
-        items.append(create_hashtag_object(key, value))
-    cache.put('trendinghashtags', items)
-    print(f"Fetching trending hashtags from database: {time.time() - start_time} seconds")
-    return items
+    if window != 'all' and window not in WINDOWS:
+        return {"error": f"Unknown window: {window}, expected all, {', '.join(WINDOWS)}"}
+
+    view = await trending_views.wait_ready('trendinghashtags')
+    if view is None:
+        return {"error": "Trending hashtags are not available yet"}
+    if window == 'all':
+        result = view.to_response()
+    else:
+        result = Response(content=encode_items(trending_hashtag_objects(window)), media_type='application/json',
+                          headers=view.staleness_headers())
+    print(f"Trending hashtags from materialized view: {time.time() - start_time} seconds")
+    return result
 
-@app.get('/recenttweets')
+@app.get('/recenttweets', responses=TWEETS_RESPONSE)
 async def get_recent_tweets():
-    if not tweets_collection:
+    if tweets_collection is None:
         return {"error": "MongoDB not connected"}
     
-    most_recent_tweets = tweets_collection.find({}).sort("created_at", -1).limit(10)
+    most_recent_tweets = await tweet_queries.get_recent_tweets(tweets_collection)
     tweets = []
 
     for tweet in most_recent_tweets:
         tweets.append(create_tweet_object(tweet))
 
-    return tweets
+    return json_response(tweets)
 
 
-@app.get('/trendingtweets')
+@app.get('/trendingtweets', responses=TWEETS_RESPONSE)
 async def get_trending_tweets():
     start_time = time.time()
-    if cache.get('trendingtweets'):
-        print(f"Trending tweets from cache: {time.time() - start_time} seconds")
-        return cache.get('trendingtweets')[0]
-    
-    if not tweets_collection:
+    if tweets_collection is None:
         return {"error": "MongoDB not connected"}
-    
-    most_recent_tweets = tweets_collection.find({}).sort("tweet_score", -1).limit(10)
-    tweets = []
-
-    for tweet in most_recent_tweets:
-        tweets.append(create_tweet_object(tweet))
 
-    cache.put('trendingtweets', tweets)
-    print(f"Fetching trending tweets from database: {time.time() - start_time} seconds")
-    return tweets
+    result = await trending_views.response('trendingtweets')
+    if result is None:
+        return {"error": "Trending tweets are not available yet"}
+    print(f"Trending tweets from materialized view: {time.time() - start_time} seconds")
+    return result
 
-@app.get('/trendingusers')
+@app.get('/trendingusers', responses=USERS_RESPONSE)
 async def get_trending_users():
     start_time = time.time()
-    if cache.get('trendingusers'):
-        print(f"Trending users from cache: {time.time() - start_time} seconds")
-        return cache.get('trendingusers')[0]
-    
     if not supabase:
         return {"error": "Supabase not connected"}
-    
-    try:
-        # Use Supabase to query users table
-        response = supabase.table('users').select(
-            'id,name,screen_name,verified,location,description,followers_count,friends_count,tweets_count'
-        ).order('followers_count', desc=True).order('tweets_count', desc=True).limit(10).execute()
-        
-        users = []
-        for user_data in response.data:
-            # Convert Supabase response to tuple format expected by create_user_object
-            user_tuple = (
-                user_data.get('id'),
-                user_data.get('name'),
-                user_data.get('screen_name'),
-                user_data.get('verified'),
-                user_data.get('location'),
-                user_data.get('description'),
-                user_data.get('followers_count'),
-                user_data.get('friends_count'),
-                user_data.get('tweets_count')
-            )
-            users.append(create_user_object(user_tuple))
-        
-        cache.put('trendingusers', users)
-        print(f"Fetching trending users from database: {time.time() - start_time} seconds")
-        return users
-    except Exception as e:
-        print(f"Error fetching trending users: {e}")
-        return []
+
+    result = await trending_views.response('trendingusers')
+    if result is None:
+        return {"error": "Trending users are not available yet"}
+    print(f"Trending users from materialized view: {time.time() - start_time} seconds")
+    return result
 
 
-@app.get('/gettweetsbyuserid')
-async def get_recent_tweets(user_id:str=''):
-    if not tweets_collection:
+@app.get('/gettweetsbyuserid', responses=TWEETS_RESPONSE)
+async def get_tweets_by_user_id(user_id:str='', limit: int = DEFAULT_PAGE_SIZE, cursor: str = '',
+                                stream: bool = False):
+    start_time = time.time()
+    if tweets_collection is None:
         return {"error": "MongoDB not connected"}
-    
-    tweets = []
-    user_tweets = tweets_collection.find({"user_screen_name": user_id[1:]}).sort("tweet_score", -1)
-    for tweet in user_tweets:
-        tweets.append(create_tweet_object(tweet))
-    return tweets
 
+    if stream:
+        return stream_tweets(tweet_queries.iter_tweets_by_screen_name(tweets_collection, user_id[1:]))
+
+    limit = clamp_page_size(limit)
+    cache_key = page_cache_key('tweetsbyuser', user_id, limit, cursor)
+    result = await cached_result(cache_key)
+    if result is not None:
+        print(f"Cached result in {time.time() - start_time} seconds")
+        return result
+
+    try:
+        after = decode_cursor(cursor)
+    except ValueError as e:
+        return {"error": str(e)}
+
+    async def load():
+        user_tweets, next_cursor = await tweet_queries.get_tweets_by_screen_name(
+            tweets_collection, user_id[1:], limit, after)
+        return await cache_page(cache_key, user_tweets, next_cursor)
+
+    result = await load_once(cache_key, load)
+    print(f"Fetching from database {time.time() - start_time} seconds")
+    return result
 
-@app.get('/filterby')
-async def get_filtered_tweets(search:str='', ishashtag: bool = False):
+
+@app.get('/filterby', responses=TWEETS_OR_USERS_RESPONSE)
+async def get_filtered_tweets(search:str='', ishashtag: bool = False, limit: int = DEFAULT_PAGE_SIZE,
+                              cursor: str = '', stream: bool = False):
     start_time = time.time()
+    if not search:
+        # An empty key would substring-match every cached entry
+        return {"error": "search must not be empty"}
     if search.startswith("@"):
-        if cache.get(search):
+        if user_index.ready:
+            result = json_response(create_user_objects(user_index.search(search[1:])))
+            print(f"Searched the user index in {time.time() - start_time} seconds")
+            return result
+
+        result = await cached_result(search)
+        if result is not None:
             print(f"Cached result in {time.time() - start_time} seconds")
-            return cache.get(search)[0]
+            return result
         search_string = search[1:]
         
         if not supabase:
             return {"error": "Supabase not connected"}
-        
-        try:
+
+        async def load():
             # Use Supabase to search users by screen_name
-            response = supabase.table('users').select('*').ilike('screen_name', f'%{search_string}%').order('followers_count', desc=True).order('tweets_count', desc=True).order('verified', desc=True).limit(10).execute()
-            
-            users = []
-            for user_data in response.data:
-                # Convert Supabase response to tuple format expected by create_user_object
-                user_tuple = (
-                    user_data.get('id'),
-                    user_data.get('name'),
-                    user_data.get('screen_name'),
-                    user_data.get('verified'),
-                    user_data.get('location'),
-                    user_data.get('description'),
-                    user_data.get('followers_count'),
-                    user_data.get('friends_count'),
-                    user_data.get('tweets_count')
-                )
-                users.append(create_user_object(user_tuple))
-            
-            cache.put(search, users)
+            users = create_user_objects(await user_queries.search_users(supabase, search_string))
+            return await cache_result(search, users)
+
+        try:
+            result = await load_once(search, load)
             print(f"Fetching from database {time.time() - start_time} seconds")
-            return users
+            return result
         except Exception as e:
             print(f"Error searching users: {e}")
             return []
             
     elif ishashtag:
-        if cache.get(search):
+        # The frontend sends the hashtag without its '#', the key gets it back so it lands in the
+        # exact-match hashtag namespace instead of the substring-matched text one
+        cache_key = search if search.startswith('#') else '#' + search
+        result = await cached_result(cache_key)
+        if result is not None:
             print(f"Cached result in {time.time() - start_time} seconds")
-            return cache.get(search)[0]
+            return result
         
-        if not tweets_collection:
+        if tweets_collection is None:
             return {"error": "MongoDB not connected"}
-        
-        matched_tweets = tweets_collection.find({"hashtag": {"$in": [search]}}).sort("tweet_score", -1).limit(10)
-        tweets = []
-        for tweet in matched_tweets:
-            tweets.append(create_tweet_object(tweet))
-        cache.put(search, tweets)
+
+        async def load():
+            matched_tweets = await tweet_queries.get_tweets_by_hashtag(tweets_collection, search)
+            return await cache_result(cache_key, create_cached_tweets(matched_tweets))
+
+        result = await load_once(cache_key, load)
         print(f"Fetching from database {time.time() - start_time} seconds")
-        return tweets
+        return result
 
     else:
-        if cache.get(search):
+        if stream:
+            if tweets_collection is None:
+                return {"error": "MongoDB not connected"}
+            return stream_tweets(tweet_queries.iter_search_tweets(tweets_collection, search))
+
+        # Every page, the first one included, is cached under an exact-match key: a substring match
+        # would answer with another query's page and its X-Next-Cursor. The backend is part of the
+        # key since the search index and Mongo hand out cursors of different formats.
+        limit = clamp_page_size(limit)
+        use_engine = search_engine is not None and search_engine.ready
+        cache_key = page_cache_key('search', 'engine' if use_engine else 'mongo', search, limit, cursor)
+        result = await cached_result(cache_key)
+        if result is not None:
             print(f"Cached result in {time.time() - start_time} seconds")
-            return cache.get(search)[0]
+            return result
         
-        if not tweets_collection:
+        if use_engine:
+            try:
+                after = search_engine_module.decode_cursor(cursor)
+            except ValueError as e:
+                return {"error": str(e)}
+
+            async def load():
+                matching_tweets, next_cursor = search_engine.search(search, limit, after)
+                return await cache_page(cache_key, matching_tweets, next_cursor)
+
+            result = await load_once(cache_key, load)
+            print(f"Fetching from search index {time.time() - start_time} seconds")
+            return result
+
+        if tweets_collection is None:
             return {"error": "MongoDB not connected"}
-        
-        matching_tweets = tweets_collection.find({"$text": {"$search": search}}).sort("tweet_score", -1)
-        tweets = []
-        for tweet in matching_tweets:
-            tweets.append(create_tweet_object(tweet))
-        cache.put(search, tweets)
+
+        try:
+            after = decode_cursor(cursor)
+        except ValueError as e:
+            return {"error": str(e)}
+
+        async def load():
+            matching_tweets, next_cursor = await tweet_queries.search_tweets(tweets_collection, search, limit, after)
+            return await cache_page(cache_key, matching_tweets, next_cursor)
+
+        result = await load_once(cache_key, load)
         print(f"Fetching from database {time.time() - start_time} seconds")
-        return tweets
+        return result
 
 
 if __name__ == "__main__":